@@ -1,9 +1,9 @@
 """Agent for parsing action parameters from natural language."""
 import os
 import sys
-import json
-from groq import Groq
-from dotenv import load_dotenv
+import asyncio
+import orjson
+from typing import Iterator, AsyncIterator
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,33 +11,16 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
+from agents.groq_client import get_client, get_async_client
+from agents.llm_cache import SemanticCache, ExactCache, context_hash
+from agents.time_format import format_datetime, format_time
 
-load_dotenv()
+# System messages are identical on every call, so build them once
+# (JSON mode enforces the output format, so the parser prompt only needs to name it)
+PARSER_SYSTEM_MSG = {"role": "system", "content": "You are a calendar event parser. Respond with a JSON object."}
+CONFLICT_SYSTEM_MSG = {"role": "system", "content": "You are a helpful calendar assistant. Provide natural, conversational responses."}
 
-
-class ActionParserAgent:
-    """Parses action parameters from natural language."""
-    
-    def __init__(self):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
-    
-    def parse_create(self, user_query: str, current_date: str = None) -> dict:
-        """
-        Parse parameters for creating an event.
-        
-        Args:
-            user_query: User's natural language query
-            current_date: Current date in format "YYYY-MM-DD" (optional)
-        
-        Returns:
-            Dictionary with: summary, start_time, end_time, description, location, attendees
-        """
-        date_context = f"Current date: {current_date}" if current_date else ""
-        
-        prompt = f"""Extract event details from this query to create a calendar event.
+CREATE_PROMPT_TEMPLATE = """Extract event details from this query to create a calendar event.
 
 {date_context}
 
@@ -51,64 +34,49 @@ Return a JSON object with:
 - location: Event location (optional, empty string if not provided)
 - attendees: List of email addresses (optional, empty list if not provided)
 
-IMPORTANT: 
+IMPORTANT:
 - Always use the current date provided to calculate relative dates like "tomorrow"
 - Always provide both start_time and end_time. If end_time is not specified, default to 1 hour after start_time.
 - Return ONLY valid JSON."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a calendar event parser. Return ONLY valid JSON, no explanations, no markdown, just the JSON object."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if content.startswith('```'):
-                parts = content.split('```')
-                if len(parts) > 1:
-                    content = parts[1]
-                    if content.startswith('json'):
-                        content = content[4:]
-                content = content.strip()
-            
-            if not content:
-                return {'error': 'Empty response from LLM'}
-            
-            result = json.loads(content)
-            return result
-            
-        except json.JSONDecodeError as e:
-            raw_content = response.choices[0].message.content if 'response' in locals() else 'No response'
-            print(f"JSON parse error: {e}")
-            print(f"Raw response: {raw_content}")
-            return {'error': f'Invalid JSON response: {str(e)}'}
-        except Exception as e:
-            return {'error': str(e)}
-    
-    def parse_modify(self, user_query: str, events: list) -> dict:
-        """
-        Parse parameters for modifying an event.
-        
-        Args:
-            user_query: User's natural language query
-            events: List of available events to help identify which event to modify
-        
-        Returns:
-            Dictionary with: event_id, and optional fields to update
-        """
-        # Format events for context
-        events_text = ""
-        for event in events[:constants.MAX_EVENTS_FOR_PARSER]:
-            events_text += f"- {event['id']}: {event['summary']} on {event['start'].strftime('%Y-%m-%d %I:%M %p')}\n"
-        
-        prompt = f"""Extract modification details from this query.
+# Keys a fast-model parse must contain to be accepted without waiting for the main model
+CREATE_REQUIRED_KEYS = ('summary', 'start_time', 'end_time')
+MODIFY_REQUIRED_KEYS = ('event_id',)
+
+CONFLICT_FALLBACK_MESSAGE = "I found a scheduling conflict. You already have an event at that time."
+
+
+class ActionParserAgent:
+    """Parses action parameters from natural language."""
+
+    def __init__(self, cache_scope: str = None):
+        # The cache file is shared by every user; the scope (user + calendar) keeps
+        # one user's parses, dates and event IDs from being served to another
+        self.cache_scope = cache_scope
+        self.client = get_client()
+        self.aclient = get_async_client()
+        self.semantic_cache = SemanticCache()
+        # Completions are only reproducible at temperature 0
+        self.exact_cache = ExactCache(enabled=constants.LLM_TEMPERATURE == 0)
+
+    def _create_prompt(self, user_query: str, current_date: str = None) -> str:
+        """Build the prompt for parse_create."""
+        date_context = f"Current date: {current_date}" if current_date else ""
+
+        return CREATE_PROMPT_TEMPLATE.format(date_context=date_context, user_query=user_query)
+
+    def _format_events_text(self, events: list) -> str:
+        """Format the first MAX_EVENTS_FOR_PARSER events as context lines for the LLM."""
+        return "\n".join([
+            f"- {event['id']}: {event['summary']} on {format_datetime(event['start'])}"
+            for event in events[:constants.MAX_EVENTS_FOR_PARSER]
+        ])
+
+    def _modify_prompt(self, user_query: str, events: list) -> str:
+        """Build the prompt for parse_modify."""
+        events_text = self._format_events_text(events)
+
+        return f"""Extract modification details from this query.
 
 Available events:
 {events_text if events_text else "No events found."}
@@ -126,161 +94,340 @@ Return a JSON object with:
 
 Return ONLY valid JSON."""
 
+    def _cancel_prompt(self, user_query: str, events: list) -> str:
+        """Build the prompt for parse_cancel."""
+        events_text = self._format_events_text(events)
+
+        return f"""Extract event to cancel from this query.
+
+Available events:
+{events_text if events_text else "No events found."}
+
+User query: "{user_query}"
+
+Return a JSON object with:
+- event_id: ID of event to cancel (from available events or user description)
+
+Return ONLY valid JSON."""
+
+    def _conflict_prompt(self, user_query: str, proposed_event: dict, conflicts: list) -> str:
+        """Build the prompt for generate_conflict_message."""
+        # Format proposed event
+        start_str = proposed_event.get('start_time', '')
+        end_str = proposed_event.get('end_time', '')
+        summary = proposed_event.get('summary', 'Event')
+
+        # Format conflicts
+        lines = []
+        for conflict in conflicts:
+            conflict_start = conflict.get('start', '')
+            conflict_end = conflict.get('end', '')
+            if hasattr(conflict_start, 'strftime'):
+                conflict_start_str = format_datetime(conflict_start)
+            else:
+                conflict_start_str = str(conflict_start)
+            if hasattr(conflict_end, 'strftime'):
+                conflict_end_str = format_time(conflict_end)
+            else:
+                conflict_end_str = str(conflict_end)
+
+            lines.append(f"- {conflict.get('summary', 'Event')} from {conflict_start_str} to {conflict_end_str}")
+        conflicts_text = "\n".join(lines)
+
+        return f"""User requested: "{user_query}"
+
+Proposed event: {summary} from {start_str} to {end_str}
+
+Conflicting events:
+{conflicts_text}
+
+Generate a friendly, conversational message informing the user about the scheduling conflict. Be concise and helpful."""
+
+    def _events_context(self, action: str, events: list) -> str:
+        """Cache context for modify/cancel: the set of event IDs shown to the LLM."""
+        event_ids = sorted(event['id'] for event in events[:constants.MAX_EVENTS_FOR_PARSER])
+        return context_hash(action, self.cache_scope, *event_ids)
+
+    def _call_llm(self, model: str, max_tokens: int, system_msg: dict, prompt: str, json_mode: bool = False) -> str:
+        """Run a chat completion and return the raw content."""
+        kwargs = {'response_format': {"type": "json_object"}} if json_mode else {}
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                system_msg,
+                {"role": "user", "content": prompt}
+            ],
+            temperature=constants.LLM_TEMPERATURE,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+        return response.choices[0].message.content
+
+    def _extract_json(self, content: str) -> dict:
+        """
+        Parse JSON from LLM output (requested in JSON mode, so no markdown to strip).
+
+        Raises:
+            orjson.JSONDecodeError: If content is not valid JSON
+        """
+        if not content or not content.strip():
+            return {'error': 'Empty response from LLM'}
+
+        return orjson.loads(content)
+
+    def _parse(self, user_query: str, prompt: str, cache_context: str,
+               system_msg: dict = PARSER_SYSTEM_MSG, model: str = None, max_tokens: int = None) -> dict:
+        """Cache lookup + LLM call + JSON parsing shared by the parse_* methods."""
+        model = model or constants.LLM_MODEL
+        max_tokens = max_tokens or constants.LLM_MAX_TOKENS
+
+        cached = self.semantic_cache.get(user_query, cache_context)
+        if cached is not None:
+            return cached
+
+        exact_key = ExactCache.make_key(model, constants.LLM_TEMPERATURE, max_tokens, system_msg['content'], prompt)
+        cached = self.exact_cache.get(exact_key)
+        if cached is not None:
+            return cached
+
+        content = None
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a calendar event parser. Return ONLY valid JSON, no explanations, no markdown, just the JSON object."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if content.startswith('```'):
-                parts = content.split('```')
-                if len(parts) > 1:
-                    content = parts[1]
-                    if content.startswith('json'):
-                        content = content[4:]
-                content = content.strip()
-            
-            if not content:
-                return {'error': 'Empty response from LLM'}
-            
-            result = json.loads(content)
+            content = self._call_llm(model, max_tokens, system_msg, prompt, json_mode=True)
+            result = self._extract_json(content)
+            self.semantic_cache.put(user_query, cache_context, result)
+            self.exact_cache.put(exact_key, result)
             return result
-            
-        except json.JSONDecodeError as e:
-            raw_content = response.choices[0].message.content if 'response' in locals() else 'No response'
+
+        except orjson.JSONDecodeError as e:
             print(f"JSON parse error: {e}")
-            print(f"Raw response: {raw_content}")
+            print(f"Raw response: {content if content is not None else 'No response'}")
             return {'error': f'Invalid JSON response: {str(e)}'}
         except Exception as e:
             return {'error': str(e)}
-    
+
+    def parse_create(self, user_query: str, current_date: str = None) -> dict:
+        """
+        Parse parameters for creating an event.
+
+        Args:
+            user_query: User's natural language query
+            current_date: Current date in format "YYYY-MM-DD" (optional)
+
+        Returns:
+            Dictionary with: summary, start_time, end_time, description, location, attendees
+        """
+        prompt = self._create_prompt(user_query, current_date)
+        return self._parse(user_query, prompt, context_hash('create', self.cache_scope, current_date))
+
+    def parse_modify(self, user_query: str, events: list) -> dict:
+        """
+        Parse parameters for modifying an event.
+
+        Args:
+            user_query: User's natural language query
+            events: List of available events to help identify which event to modify
+
+        Returns:
+            Dictionary with: event_id, and optional fields to update
+        """
+        prompt = self._modify_prompt(user_query, events)
+        return self._parse(user_query, prompt, self._events_context('modify', events))
+
     def parse_cancel(self, user_query: str, events: list) -> dict:
         """
         Parse parameters for canceling an event.
-        
+
         Args:
             user_query: User's natural language query
             events: List of available events to help identify which event to cancel
-        
+
         Returns:
             Dictionary with: event_id
         """
-        # Format events for context
-        events_text = ""
-        for event in events[:constants.MAX_EVENTS_FOR_PARSER]:
-            events_text += f"- {event['id']}: {event['summary']} on {event['start'].strftime('%Y-%m-%d %I:%M %p')}\n"
-        
-        prompt = f"""Extract event to cancel from this query.
+        prompt = self._cancel_prompt(user_query, events)
+        return self._parse(
+            user_query, prompt, self._events_context('cancel', events),
+            model=constants.LLM_MODEL_FAST, max_tokens=constants.LLM_FAST_MAX_TOKENS
+        )
 
-Available events:
-{events_text if events_text else "No events found."}
+    def generate_conflict_message(self, user_query: str, proposed_event: dict, conflicts: list) -> str:
+        """
+        Generate a conversational message about scheduling conflicts.
 
-User query: "{user_query}"
+        Args:
+            user_query: Original user query
+            proposed_event: Proposed event details (summary, start_time, end_time)
+            conflicts: List of conflicting events
 
-Return a JSON object with:
-- event_id: ID of event to cancel (from available events or user description)
+        Returns:
+            Conversational message about the conflict
+        """
+        prompt = self._conflict_prompt(user_query, proposed_event, conflicts)
 
-Return ONLY valid JSON."""
+        try:
+            content = self._call_llm(constants.LLM_MODEL_FAST, constants.LLM_FAST_MAX_TOKENS, CONFLICT_SYSTEM_MSG, prompt)
+            return content.strip()
+
+        except Exception as e:
+            return CONFLICT_FALLBACK_MESSAGE
+
+    def generate_conflict_message_stream(self, user_query: str, proposed_event: dict, conflicts: list) -> Iterator[str]:
+        """
+        Stream a conversational message about scheduling conflicts.
+
+        Args:
+            user_query: Original user query
+            proposed_event: Proposed event details (summary, start_time, end_time)
+            conflicts: List of conflicting events
+
+        Yields:
+            Message text chunks as they are generated
+        """
+        prompt = self._conflict_prompt(user_query, proposed_event, conflicts)
 
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
+            stream = self.client.chat.completions.create(
+                model=constants.LLM_MODEL_FAST,
                 messages=[
-                    {"role": "system", "content": "You are a calendar event parser. Return ONLY valid JSON, no explanations, no markdown, just the JSON object."},
+                    CONFLICT_SYSTEM_MSG,
                     {"role": "user", "content": prompt}
                 ],
                 temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
+                max_tokens=constants.LLM_FAST_MAX_TOKENS,
+                stream=True
             )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if content.startswith('```'):
-                parts = content.split('```')
-                if len(parts) > 1:
-                    content = parts[1]
-                    if content.startswith('json'):
-                        content = content[4:]
-                content = content.strip()
-            
-            if not content:
-                return {'error': 'Empty response from LLM'}
-            
-            result = json.loads(content)
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+        except Exception as e:
+            yield CONFLICT_FALLBACK_MESSAGE
+
+    async def _acall_llm(self, model: str, max_tokens: int, system_msg: dict, prompt: str, json_mode: bool = False) -> str:
+        """Run a chat completion on the async client and return the raw content."""
+        kwargs = {'response_format': {"type": "json_object"}} if json_mode else {}
+        response = await self.aclient.chat.completions.create(
+            model=model,
+            messages=[
+                system_msg,
+                {"role": "user", "content": prompt}
+            ],
+            temperature=constants.LLM_TEMPERATURE,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+        return response.choices[0].message.content
+
+    async def _aspeculate(self, model: str, max_tokens: int, system_msg: dict, prompt: str,
+                          required_keys: tuple) -> dict:
+        """
+        Race the fast model against the main model.
+
+        The fast result is used if it parses and has every required key; otherwise
+        the main model's result is awaited.
+        """
+        fast = asyncio.create_task(self._acall_llm(constants.LLM_MODEL_FAST, max_tokens, system_msg, prompt, json_mode=True))
+        main = asyncio.create_task(self._acall_llm(model, max_tokens, system_msg, prompt, json_mode=True))
+        try:
+            fast_result = self._extract_json(await fast)
+            if all(fast_result.get(key) for key in required_keys):
+                main.cancel()
+                return fast_result
+        except Exception as e:
+            print(f"Fast model parse rejected: {e}")
+        return self._extract_json(await main)
+
+    async def _aparse(self, user_query: str, prompt: str, cache_context: str,
+                      system_msg: dict = PARSER_SYSTEM_MSG, model: str = None, max_tokens: int = None,
+                      required_keys: tuple = None) -> dict:
+        """
+        Async cache lookup + LLM call + JSON parsing shared by the aparse_* methods.
+
+        With required_keys, the fast model is raced against the main model (see _aspeculate).
+        """
+        model = model or constants.LLM_MODEL
+        max_tokens = max_tokens or constants.LLM_MAX_TOKENS
+
+        cached = self.semantic_cache.get(user_query, cache_context)
+        if cached is not None:
+            return cached
+
+        exact_key = ExactCache.make_key(model, constants.LLM_TEMPERATURE, max_tokens, system_msg['content'], prompt)
+        cached = self.exact_cache.get(exact_key)
+        if cached is not None:
+            return cached
+
+        content = None
+        try:
+            if required_keys and model != constants.LLM_MODEL_FAST:
+                result = await self._aspeculate(model, max_tokens, system_msg, prompt, required_keys)
+            else:
+                content = await self._acall_llm(model, max_tokens, system_msg, prompt, json_mode=True)
+                result = self._extract_json(content)
+            self.semantic_cache.put(user_query, cache_context, result)
+            self.exact_cache.put(exact_key, result)
             return result
-            
-        except json.JSONDecodeError as e:
-            raw_content = response.choices[0].message.content if 'response' in locals() else 'No response'
+
+        except orjson.JSONDecodeError as e:
             print(f"JSON parse error: {e}")
-            print(f"Raw response: {raw_content}")
+            print(f"Raw response: {content if content is not None else 'No response'}")
             return {'error': f'Invalid JSON response: {str(e)}'}
         except Exception as e:
             return {'error': str(e)}
-    
-    def generate_conflict_message(self, user_query: str, proposed_event: dict, conflicts: list) -> str:
-        """
-        Generate a conversational message about scheduling conflicts.
-        
-        Args:
-            user_query: Original user query
-            proposed_event: Proposed event details (summary, start_time, end_time)
-            conflicts: List of conflicting events
-        
-        Returns:
-            Conversational message about the conflict
-        """
-        # Format proposed event
-        start_str = proposed_event.get('start_time', '')
-        end_str = proposed_event.get('end_time', '')
-        summary = proposed_event.get('summary', 'Event')
-        
-        # Format conflicts
-        conflicts_text = ""
-        for conflict in conflicts:
-            conflict_start = conflict.get('start', '')
-            conflict_end = conflict.get('end', '')
-            if hasattr(conflict_start, 'strftime'):
-                conflict_start_str = conflict_start.strftime('%Y-%m-%d %I:%M %p')
-            else:
-                conflict_start_str = str(conflict_start)
-            if hasattr(conflict_end, 'strftime'):
-                conflict_end_str = conflict_end.strftime('%I:%M %p')
-            else:
-                conflict_end_str = str(conflict_end)
-            
-            conflicts_text += f"- {conflict.get('summary', 'Event')} from {conflict_start_str} to {conflict_end_str}\n"
-        
-        prompt = f"""User requested: "{user_query}"
 
-Proposed event: {summary} from {start_str} to {end_str}
+    async def aparse_create(self, user_query: str, current_date: str = None) -> dict:
+        """Async version of parse_create."""
+        prompt = self._create_prompt(user_query, current_date)
+        return await self._aparse(
+            user_query, prompt, context_hash('create', self.cache_scope, current_date),
+            required_keys=CREATE_REQUIRED_KEYS
+        )
 
-Conflicting events:
-{conflicts_text}
+    async def aparse_modify(self, user_query: str, events: list) -> dict:
+        """Async version of parse_modify."""
+        prompt = self._modify_prompt(user_query, events)
+        return await self._aparse(
+            user_query, prompt, self._events_context('modify', events),
+            required_keys=MODIFY_REQUIRED_KEYS
+        )
 
-Generate a friendly, conversational message informing the user about the scheduling conflict. Be concise and helpful."""
+    async def aparse_cancel(self, user_query: str, events: list) -> dict:
+        """Async version of parse_cancel."""
+        prompt = self._cancel_prompt(user_query, events)
+        return await self._aparse(
+            user_query, prompt, self._events_context('cancel', events),
+            model=constants.LLM_MODEL_FAST, max_tokens=constants.LLM_FAST_MAX_TOKENS
+        )
 
+    async def agenerate_conflict_message(self, user_query: str, proposed_event: dict, conflicts: list) -> str:
+        """Async version of generate_conflict_message."""
+        prompt = self._conflict_prompt(user_query, proposed_event, conflicts)
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
+            content = await self._acall_llm(constants.LLM_MODEL_FAST, constants.LLM_FAST_MAX_TOKENS, CONFLICT_SYSTEM_MSG, prompt)
+            return content.strip()
+        except Exception as e:
+            return CONFLICT_FALLBACK_MESSAGE
+
+    async def agenerate_conflict_message_stream(self, user_query: str, proposed_event: dict, conflicts: list) -> AsyncIterator[str]:
+        """Async version of generate_conflict_message_stream."""
+        prompt = self._conflict_prompt(user_query, proposed_event, conflicts)
+
+        try:
+            stream = await self.aclient.chat.completions.create(
+                model=constants.LLM_MODEL_FAST,
                 messages=[
-                    {"role": "system", "content": "You are a helpful calendar assistant. Provide natural, conversational responses."},
+                    CONFLICT_SYSTEM_MSG,
                     {"role": "user", "content": prompt}
                 ],
                 temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
+                max_tokens=constants.LLM_FAST_MAX_TOKENS,
+                stream=True
             )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            return f"I found a scheduling conflict. You already have an event at that time."
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
 
+        except Exception as e:
+            yield CONFLICT_FALLBACK_MESSAGE
@@ -1,9 +1,10 @@
 """Calendar agent for retrieving and storing calendar events."""
-from typing import Dict, Any, List
-from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 from googleapiclient.errors import HttpError
-import sqlite3
-import json
+import asyncio
+import time
+import orjson
 import sys
 import os
 
@@ -15,6 +16,32 @@ if parent_dir not in sys.path:
 import constants
 from database import CalendarDatabase
 
+# Local bindings for the per-event parsing loop
+_UTC = timezone.utc
+_EMPTY = ()
+
+try:
+    # C parser; handles the 'Z' suffix without a string copy
+    from ciso8601 import parse_datetime as _parse_iso
+except ImportError:
+    def _parse_iso(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+# Keeps the original created_at when an event is re-stored
+_UPSERT_EVENT_SQL = '''
+    INSERT OR REPLACE INTO events 
+    (id, summary, description, start_time, end_time, location, 
+     attendees, status, html_link, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 
+            COALESCE((SELECT created_at FROM events WHERE id = ?), ?), ?)
+'''
+
+
+def _format_sqlite(dt: datetime) -> str:
+    """Same output as dt.strftime('%Y-%m-%d %H:%M:%S') without parsing the format string."""
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
+
 
 class CalendarAgent:
     """Agent for retrieving and storing calendar events."""
@@ -33,8 +60,66 @@ class CalendarAgent:
         self.service = calendar_service
         self.db_path = db_path
         self.timezone_manager = timezone_manager
-        # Initialize database (creates schema if needed)
-        CalendarDatabase(db_path)
+        # Initialize database (creates schema if needed) and keep its persistent connection
+        # (autocommit mode; writes use explicit BEGIN IMMEDIATE/COMMIT)
+        self._db = CalendarDatabase(db_path)
+        self._conn = self._db.conn
+        self._lock = self._db.lock
+        # Short-lived cache of the last get_all_events result, as one (key, fetched_at, result) tuple
+        # so readers on other threads never see a key from one fetch and events from another
+        self._events_cache = None
+        # Bumped on invalidation so a fetch that started before a change doesn't re-cache stale events
+        self._events_cache_generation = 0
+        # Background database syncs started by aget_all_events
+        self._pending_writes = set()
+    
+    def _events_cache_key_now(self):
+        """Cache key: calendar plus the timezone events were converted to."""
+        tz_name = self.timezone_manager.get_timezone_name() if self.timezone_manager else None
+        return (constants.CALENDAR_ID, tz_name)
+    
+    def invalidate_events_cache(self):
+        """Drop the cached event list (call after creating, modifying or cancelling events)."""
+        self._events_cache_generation += 1
+        self._events_cache = None
+    
+    def upsert_event(self, event: Dict[str, Any]):
+        """
+        Store one event resource returned by an insert or update, instead of re-syncing the calendar.
+        
+        Args:
+            event: Event resource from the Calendar API
+        """
+        tz_conv = self.timezone_manager.convert_to_user_tz if self.timezone_manager else None
+        self._store_events([self._process_event(event, tz_conv)])
+        self.invalidate_events_cache()
+    
+    def delete_event(self, event_id: str):
+        """Remove one cancelled event from the database."""
+        with self._lock:
+            self._conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+        self.invalidate_events_cache()
+    
+    def resync_events(self) -> Dict[str, Any]:
+        """
+        Discard the stored events and sync token, repopulating them with a full sync.
+        
+        Returns:
+            Result of get_all_events(store_in_db=True)
+        """
+        # Dropping only the sync token forces a full sync, which replaces the events in
+        # one transaction, so readers never see an empty table in between
+        self._db.clear_sync_state()
+        self.invalidate_events_cache()
+        return self.get_all_events(store_in_db=True)
+    
+    def get_stored_events(self) -> List[Dict[str, Any]]:
+        """Upcoming events from the database, without calling Google Calendar."""
+        return self._load_upcoming_events()
+    
+    def close(self):
+        """Close the persistent database connection."""
+        self._db.close()
     
     def get_all_events(self, store_in_db: bool = True) -> Dict[str, Any]:
         """
@@ -42,7 +127,9 @@ class CalendarAgent:
         Optionally stores them in the database.
         
         Args:
-            store_in_db: Whether to store events in database (default: True)
+            store_in_db: Whether to store events in database (default: True).
+                         Storing syncs incrementally via the saved sync token and
+                         returns the upcoming events from the database.
         
         Returns:
             Dictionary with events and metadata:
@@ -51,71 +138,33 @@ class CalendarAgent:
             - count: Number of events retrieved
             - message: Status message
         """
+        cache_key = self._events_cache_key_now()
+        cached = self._events_cache
+        if (not store_in_db and cached is not None and cached[0] == cache_key
+                and time.monotonic() - cached[1] < constants.EVENTS_CACHE_TTL_SEC):
+            cached_result = cached[2]
+            return {**cached_result, 'events': list(cached_result['events'])}
+        generation = self._events_cache_generation
+        
         try:
-            # Get current time
-            now = datetime.now(timezone.utc)
-            time_min = now.isoformat().replace('+00:00', 'Z')
-            
-            # Query calendar for upcoming events
-            events_result = self.service.events().list(
-                calendarId=constants.CALENDAR_ID,
-                timeMin=time_min,
-                maxResults=constants.NUM_RECENT_EVENTS,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            
-            events = events_result.get('items', [])
-
-            
-            # Process events into structured format
-            processed_events = []
-            for event in events:
-                event_start = event['start'].get('dateTime', event['start'].get('date'))
-                event_end = event['end'].get('dateTime', event['end'].get('date'))
-                
-                # Parse event times
-                if 'T' in event_start:
-                    event_start_dt = datetime.fromisoformat(event_start.replace('Z', '+00:00'))
-                    event_end_dt = datetime.fromisoformat(event_end.replace('Z', '+00:00'))
-                else:
-                    # All-day event
-                    event_start_dt = datetime.fromisoformat(event_start).replace(tzinfo=timezone.utc)
-                    event_end_dt = datetime.fromisoformat(event_end).replace(tzinfo=timezone.utc)
-                
-                # Convert to user timezone if timezone_manager is available
-                if self.timezone_manager:
-                    event_start_dt = self.timezone_manager.convert_to_user_tz(event_start_dt)
-                    event_end_dt = self.timezone_manager.convert_to_user_tz(event_end_dt)
-                
-                processed_event = {
-                    'id': event.get('id'),
-                    'summary': event.get('summary', 'No title'),
-                    'description': event.get('description', ''),
-                    'start': event_start_dt,
-                    'end': event_end_dt,
-                    'location': event.get('location', ''),
-                    'attendees': [att.get('email', '') for att in event.get('attendees', [])],
-                    'status': event.get('status', 'confirmed'),
-                    'htmlLink': event.get('htmlLink', '')
-                }
-                
-                processed_events.append(processed_event)
-
-            # Store events in database if requested
-            if store_in_db and processed_events:
-                stored_count = self._store_events(processed_events)
-                message = f'Retrieved {len(processed_events)} events and stored {stored_count} in database'
+            if store_in_db:
+                # Apply changes since the last sync, then serve events from the database
+                changed_count = self._sync_events()
+                processed_events = self._load_upcoming_events()
+                message = f'Retrieved {len(processed_events)} events and synced {changed_count} changes to database'
             else:
+                processed_events = self._fetch_upcoming_events()
                 message = f'Retrieved {len(processed_events)} events'
             
-            return {
+            result = {
                 'success': True,
                 'events': processed_events,
                 'count': len(processed_events),
                 'message': message
             }
+            if generation == self._events_cache_generation:
+                self._events_cache = (cache_key, time.monotonic(), {**result, 'events': list(processed_events)})
+            return result
             
         except HttpError as error:
             return {
@@ -134,63 +183,269 @@ class CalendarAgent:
                 'error': str(e)
             }
     
-    def _store_events(self, events: List[Dict[str, Any]]) -> int:
-        """Store events in the database."""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            count = 0
-            if self.timezone_manager:
-                now = self.timezone_manager.format_for_sqlite(self.timezone_manager.now_in_user_tz())
+    async def aget_all_events(self, store_in_db: bool = True) -> Dict[str, Any]:
+        """
+        Async version of get_all_events.
+        
+        The Google Calendar request runs on a worker thread. When store_in_db is
+        True, the database sync is started in the background and the fetched
+        events are returned without waiting for it; await flush_writes() to wait.
+        """
+        result = await asyncio.to_thread(self.get_all_events, False)
+        if store_in_db and result.get('success'):
+            task = asyncio.create_task(asyncio.to_thread(self._sync_events))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+        return result
+    
+    async def flush_writes(self):
+        """Wait for background database syncs started by aget_all_events."""
+        if self._pending_writes:
+            results = await asyncio.gather(*self._pending_writes, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"Error syncing events: {result}")
+    
+    def _fetch_upcoming_events(self) -> List[Dict[str, Any]]:
+        """Fetch up to NUM_RECENT_EVENTS upcoming events directly from Google Calendar."""
+        # Current time in RFC3339 UTC
+        time_min = datetime.now(_UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
+        
+        # Query calendar for upcoming events
+        events_result = self.service.events().list(
+            calendarId=constants.CALENDAR_ID,
+            timeMin=time_min,
+            maxResults=constants.NUM_RECENT_EVENTS,
+            singleEvents=True,
+            orderBy='startTime',
+            fields=constants.EVENT_LIST_FIELDS
+        ).execute()
+        
+        events = events_result.get('items', [])
+        
+        # Process events into structured format
+        tz_conv = self.timezone_manager.convert_to_user_tz if self.timezone_manager else None
+        process = self._process_event
+        return [process(event, tz_conv) for event in events]
+    
+    def _list_changes(self, **params) -> Tuple[List[tuple], List[tuple], Optional[str]]:
+        """
+        Page through events().list, converting each page to database rows as it arrives.
+        
+        Only the compact row tuples are kept, so peak memory is one page of API
+        resources rather than the whole listing.
+        
+        Returns:
+            Tuple of (cancelled (id,) tuples, _UPSERT_EVENT_SQL rows, nextSyncToken from the last page)
+        """
+        tz_conv = self.timezone_manager.convert_to_user_tz if self.timezone_manager else None
+        process = self._process_event
+        cancelled_ids = []
+        changed_rows = []
+        page_token = None
+        while True:
+            result = self.service.events().list(
+                calendarId=constants.CALENDAR_ID,
+                singleEvents=True,
+                pageToken=page_token,
+                fields=constants.EVENT_LIST_FIELDS,
+                **params
+            ).execute()
+            items = result.get('items', [])
+            cancelled_ids.extend((item['id'],) for item in items if item.get('status') == 'cancelled')
+            changed_rows.extend(self._event_rows(
+                [process(item, tz_conv) for item in items if item.get('status') != 'cancelled']
+            ))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return cancelled_ids, changed_rows, result.get('nextSyncToken')
+    
+    def _sync_events(self) -> int:
+        """
+        Bring the database up to date with Google Calendar.
+        
+        Uses the stored sync token to fetch only changed events; falls back to a
+        full sync of events in the next SYNC_HORIZON_DAYS when there is no token or it has expired.
+        
+        Returns:
+            Number of events added, updated or deleted
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT sync_token FROM sync_state WHERE calendar_id = ?', (constants.CALENDAR_ID,)
+            ).fetchone()
+        sync_token = row[0] if row else None
+        
+        changes = None
+        if sync_token:
+            try:
+                changes = self._list_changes(syncToken=sync_token)
+            except HttpError as error:
+                # 410 Gone: token expired, a full sync is required
+                if error.resp.status != 410:
+                    raise
+        full_sync = changes is None
+        if full_sync:
+            # singleEvents expands recurring events, so an open-ended window would page through
+            # every future instance of every series; later incremental syncs still report all changes
+            now = datetime.now(_UTC)
+            time_min = now.strftime('%Y-%m-%dT%H:%M:%SZ')
+            time_max = (now + timedelta(days=constants.SYNC_HORIZON_DAYS)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            changes = self._list_changes(timeMin=time_min, timeMax=time_max)
+        cancelled_ids, changed_rows, next_token = changes
+        
+        # Deletions, upserts and the new sync token commit together: one fsync, and the
+        # token is never saved for changes that were not stored
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if full_sync:
+                    self._conn.execute('DELETE FROM events')
+                if cancelled_ids:
+                    self._conn.executemany('DELETE FROM events WHERE id = ?', cancelled_ids)
+                if changed_rows:
+                    self._conn.executemany(_UPSERT_EVENT_SQL, changed_rows)
+                if next_token:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, updated_at) VALUES (?, ?, ?)',
+                        (constants.CALENDAR_ID, next_token, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        
+        return len(changed_rows) + len(cancelled_ids)
+    
+    def _load_upcoming_events(self) -> List[Dict[str, Any]]:
+        """Load up to NUM_RECENT_EVENTS upcoming events from the database."""
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT id, summary, description, start_time, end_time, location,
+                       attendees, status, html_link
+                FROM events WHERE end_time >= ? ORDER BY start_time LIMIT ?
+            ''', (now, constants.NUM_RECENT_EVENTS)).fetchall()
+        
+        if self.timezone_manager:
+            parse = self.timezone_manager.parse_from_sqlite
+        else:
+            parse = lambda value: datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=_UTC)
+        
+        return [
+            {
+                'id': event_id,
+                'summary': summary,
+                'description': description,
+                'start': parse(start_time),
+                'end': parse(end_time),
+                'location': location,
+                'attendees': orjson.loads(attendees) if attendees else [],
+                'status': status,
+                'htmlLink': html_link
+            }
+            for event_id, summary, description, start_time, end_time, location, attendees, status, html_link in rows
+        ]
+    
+    def _process_event(self, event: Dict[str, Any], tz_conv=None) -> Dict[str, Any]:
+        """
+        Convert a Google Calendar event resource into a structured event dictionary.
+        
+        Args:
+            event: Event resource from the Calendar API
+            tz_conv: Optional function converting datetimes to the user's timezone
+        """
+        start = event['start']
+        end = event['end']
+        event_start = start.get('dateTime') or start.get('date')
+        event_end = end.get('dateTime') or end.get('date')
+        
+        # Parse event times
+        if 'T' in event_start:
+            event_start_dt = _parse_iso(event_start)
+            event_end_dt = _parse_iso(event_end)
+        else:
+            # All-day event
+            event_start_dt = _parse_iso(event_start).replace(tzinfo=_UTC)
+            event_end_dt = _parse_iso(event_end).replace(tzinfo=_UTC)
+        
+        # Convert to user timezone if available
+        if tz_conv:
+            event_start_dt = tz_conv(event_start_dt)
+            event_end_dt = tz_conv(event_end_dt)
+        
+        get = event.get
+        return {
+            'id': get('id'),
+            'summary': get('summary', 'No title'),
+            'description': get('description', ''),
+            'start': event_start_dt,
+            'end': event_end_dt,
+            'location': get('location', ''),
+            'attendees': [att['email'] for att in get('attendees') or _EMPTY if 'email' in att],
+            'status': get('status', 'confirmed'),
+            'htmlLink': get('htmlLink', '')
+        }
+    
+    def _event_rows(self, events: List[Dict[str, Any]]) -> List[tuple]:
+        """Parameter tuples for _UPSERT_EVENT_SQL, one per event."""
+        if self.timezone_manager:
+            now = self.timezone_manager.format_for_sqlite(self.timezone_manager.now_in_user_tz())
+        else:
+            now = _format_sqlite(datetime.now(_UTC))
+        
+        rows = []
+        for event in events:
+            # Convert to SQLite-friendly 24-hour format (YYYY-MM-DD HH:MM:SS) in UTC
+            if isinstance(event['start'], datetime):
+                if self.timezone_manager:
+                    start_time = self.timezone_manager.format_for_sqlite(event['start'])
+                else:
+                    start_time = _format_sqlite(event['start'])
             else:
-                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                start_time = event['start']
             
-            for event in events:
-                # Convert to SQLite-friendly 24-hour format (YYYY-MM-DD HH:MM:SS) in UTC
-                if isinstance(event['start'], datetime):
-                    if self.timezone_manager:
-                        start_time = self.timezone_manager.format_for_sqlite(event['start'])
-                    else:
-                        start_time = event['start'].strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    start_time = event['start']
-                
-                if isinstance(event['end'], datetime):
-                    if self.timezone_manager:
-                        end_time = self.timezone_manager.format_for_sqlite(event['end'])
-                    else:
-                        end_time = event['end'].strftime('%Y-%m-%d %H:%M:%S')
+            if isinstance(event['end'], datetime):
+                if self.timezone_manager:
+                    end_time = self.timezone_manager.format_for_sqlite(event['end'])
                 else:
-                    end_time = event['end']
-                
-                attendees_json = json.dumps(event.get('attendees', []))
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO events 
-                    (id, summary, description, start_time, end_time, location, 
-                     attendees, status, html_link, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 
-                            COALESCE((SELECT created_at FROM events WHERE id = ?), ?), ?)
-                ''', (
-                    event.get('id'),
-                    event.get('summary', ''),
-                    event.get('description', ''),
-                    start_time,
-                    end_time,
-                    event.get('location', ''),
-                    attendees_json,
-                    event.get('status', 'confirmed'),
-                    event.get('htmlLink', ''),
-                    event.get('id'),
-                    now,
-                    now
-                ))
-                count += 1
+                    end_time = _format_sqlite(event['end'])
+            else:
+                end_time = event['end']
+            
+            attendees_json = orjson.dumps(event.get('attendees', [])).decode()
+            
+            rows.append((
+                event.get('id'),
+                event.get('summary', ''),
+                event.get('description', ''),
+                start_time,
+                end_time,
+                event.get('location', ''),
+                attendees_json,
+                event.get('status', 'confirmed'),
+                event.get('htmlLink', ''),
+                event.get('id'),
+                now,
+                now
+            ))
+        return rows
+    
+    def _store_events(self, events: List[Dict[str, Any]]) -> int:
+        """Store events in the database."""
+        try:
+            rows = self._event_rows(events)
             
-            conn.commit()
-            conn.close()
-            return count
+            # Single transaction for the whole batch
+            with self._lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany(_UPSERT_EVENT_SQL, rows)
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            return len(rows)
             
         except Exception as e:
             print(f"Error storing events: {e}")
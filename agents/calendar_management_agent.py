@@ -1,7 +1,9 @@
 """Agent for creating, modifying, and canceling calendar events."""
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timezone
 from googleapiclient.errors import HttpError
+import asyncio
+import logging
 import sys
 import os
 
@@ -12,6 +14,20 @@ if parent_dir not in sys.path:
 
 import constants
 
+logger = logging.getLogger(__name__)
+
+
+def _parse_rfc3339(value: str) -> datetime:
+    """Parse an RFC3339 dateTime, mapping a 'Z' suffix straight to UTC."""
+    if value.endswith('Z'):
+        return datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(value)
+
+
+def _format_rfc3339(dt: datetime) -> str:
+    """Same output as dt.strftime('%Y-%m-%dT%H:%M:%SZ') without parsing the format string."""
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}T{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}Z"
+
 
 class CalendarManagementAgent:
     """Agent for managing calendar events (create, modify, cancel)."""
@@ -27,6 +43,12 @@ class CalendarManagementAgent:
         self.service = calendar_service
         self.timezone_manager = timezone_manager
     
+    def _to_utc(self, dt: datetime) -> datetime:
+        """Convert a user-timezone datetime to UTC."""
+        if self.timezone_manager:
+            return self.timezone_manager.convert_to_utc(dt)
+        return dt.astimezone(timezone.utc) if dt.tzinfo else dt
+    
     def create_event(self, summary: str, start_time: datetime, end_time: datetime,
                     description: str = "", location: str = "", attendees: list = None) -> Dict[str, Any]:
         """
@@ -43,64 +65,97 @@ class CalendarManagementAgent:
         Returns:
             Dictionary with success status and event details
         """
-        try:
-            # Convert to UTC for Google Calendar API
-            if self.timezone_manager:
-                start_utc = self.timezone_manager.convert_to_utc(start_time)
-                end_utc = self.timezone_manager.convert_to_utc(end_time)
-            else:
-                start_utc = start_time.astimezone(timezone.utc) if start_time.tzinfo else start_time
-                end_utc = end_time.astimezone(timezone.utc) if end_time.tzinfo else end_time
-            
-            # Format for Google Calendar API (RFC3339)
-            start_rfc = start_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
-            end_rfc = end_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
-            
-            print(f"Creating event: {summary}")
-            print(f"UTC times: start={start_rfc}, end={end_rfc}")
-            
-            event_body = {
-                'summary': summary,
-                'description': description,
-                'location': location,
-                'start': {'dateTime': start_rfc, 'timeZone': 'UTC'},
-                'end': {'dateTime': end_rfc, 'timeZone': 'UTC'},
-            }
-            
-            if attendees:
-                event_body['attendees'] = [{'email': email} for email in attendees]
-            
-            print(f"Event body: {event_body}")
-            event = self.service.events().insert(calendarId=constants.CALENDAR_ID, body=event_body).execute()
-            print(f"Event created: {event.get('id')}, start: {event.get('start')}, end: {event.get('end')}")
-            
-            # Verify event was created
-            if event and event.get('id'):
-                return {
+        return self.create_events_bulk([{
+            'summary': summary,
+            'start_time': start_time,
+            'end_time': end_time,
+            'description': description,
+            'location': location,
+            'attendees': attendees
+        }])[0]
+    
+    def create_events_bulk(self, event_specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create several calendar events in a single batch HTTP request.
+        
+        Args:
+            event_specs: List of dicts with create_event() keyword arguments
+        
+        Returns:
+            List of result dictionaries, in the same order as event_specs
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(event_specs)
+        
+        def on_insert(request_id, event, exception):
+            index = int(request_id)
+            summary = event_specs[index]['summary']
+            if exception is not None:
+                results[index] = {
+                    'success': False,
+                    'error': str(exception),
+                    'message': f"Failed to create event: {exception}"
+                }
+            elif event and event.get('id'):
+                logger.debug("Event created: %s, start: %s, end: %s", event.get('id'), event.get('start'), event.get('end'))
+                results[index] = {
                     'success': True,
                     'event_id': event.get('id'),
                     'summary': event.get('summary'),
+                    'event': event,
                     'message': f"Event '{summary}' created successfully"
                 }
             else:
-                return {
+                results[index] = {
                     'success': False,
                     'error': 'Event creation returned no event ID',
                     'message': 'Failed to create event: No event ID returned'
                 }
+        
+        try:
+            batch = self.service.new_batch_http_request(callback=on_insert)
+            # Build the events resource once rather than per event
+            events = self.service.events()
+            calendar_id = constants.CALENDAR_ID
+            for index, spec in enumerate(event_specs):
+                # Format for Google Calendar API (RFC3339, UTC)
+                start_rfc = _format_rfc3339(self._to_utc(spec['start_time']))
+                end_rfc = _format_rfc3339(self._to_utc(spec['end_time']))
+                
+                logger.debug("Creating event: %s", spec['summary'])
+                logger.debug("UTC times: start=%s, end=%s", start_rfc, end_rfc)
+                
+                event_body = {
+                    'summary': spec['summary'],
+                    'description': spec.get('description', ''),
+                    'location': spec.get('location', ''),
+                    'start': {'dateTime': start_rfc, 'timeZone': 'UTC'},
+                    'end': {'dateTime': end_rfc, 'timeZone': 'UTC'},
+                }
+                
+                if spec.get('attendees'):
+                    event_body['attendees'] = [{'email': email} for email in spec['attendees']]
+                
+                batch.add(
+                    events.insert(calendarId=calendar_id, body=event_body),
+                    request_id=str(index)
+                )
+            
+            batch.execute()
             
         except HttpError as error:
-            return {
+            return [{
                 'success': False,
                 'error': str(error),
                 'message': f"Failed to create event: {error}"
-            }
+            } for _ in event_specs]
         except Exception as e:
-            return {
+            return [{
                 'success': False,
                 'error': str(e),
                 'message': f"Error creating event: {str(e)}"
-            }
+            } for _ in event_specs]
+        
+        return results
     
     def modify_event(self, event_id: str, summary: Optional[str] = None,
                     start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
@@ -122,19 +177,24 @@ class CalendarManagementAgent:
             Dictionary with success status and event details
         """
         try:
-            # Get existing event
-            event = self.service.events().get(calendarId=constants.CALENDAR_ID, eventId=event_id).execute()
+            events = self.service.events()
+            calendar_id = constants.CALENDAR_ID
+            
+            # Only the changed fields are sent (patch), so the existing event is
+            # fetched only when its duration is needed
+            event = {}
             
             # Calculate original duration if start_time is provided but end_time is not
             if start_time and not end_time:
+                original = events.get(calendarId=calendar_id, eventId=event_id).execute()
                 # Parse original start and end times
-                original_start_str = event['start'].get('dateTime', event['start'].get('date'))
-                original_end_str = event['end'].get('dateTime', event['end'].get('date'))
+                original_start_str = original['start'].get('dateTime', original['start'].get('date'))
+                original_end_str = original['end'].get('dateTime', original['end'].get('date'))
                 
                 # Parse to datetime
                 if 'T' in original_start_str:
-                    original_start = datetime.fromisoformat(original_start_str.replace('Z', '+00:00'))
-                    original_end = datetime.fromisoformat(original_end_str.replace('Z', '+00:00'))
+                    original_start = _parse_rfc3339(original_start_str)
+                    original_end = _parse_rfc3339(original_end_str)
                 else:
                     original_start = datetime.fromisoformat(original_start_str).replace(tzinfo=timezone.utc)
                     original_end = datetime.fromisoformat(original_end_str).replace(tzinfo=timezone.utc)
@@ -155,27 +215,21 @@ class CalendarManagementAgent:
             if attendees is not None:
                 event['attendees'] = [{'email': email} for email in attendees]
             
-            # Update times if provided
+            # Update times if provided; patch merges objects, so null out 'date' in case it was all-day
             if start_time or end_time:
                 if start_time:
-                    if self.timezone_manager:
-                        start_utc = self.timezone_manager.convert_to_utc(start_time)
-                    else:
-                        start_utc = start_time.astimezone(timezone.utc) if start_time.tzinfo else start_time
-                    start_rfc = start_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
-                    event['start'] = {'dateTime': start_rfc, 'timeZone': 'UTC'}
+                    start_utc = self._to_utc(start_time)
+                    start_rfc = _format_rfc3339(start_utc)
+                    event['start'] = {'dateTime': start_rfc, 'timeZone': 'UTC', 'date': None}
                 
                 if end_time:
-                    if self.timezone_manager:
-                        end_utc = self.timezone_manager.convert_to_utc(end_time)
-                    else:
-                        end_utc = end_time.astimezone(timezone.utc) if end_time.tzinfo else end_time
-                    end_rfc = end_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
-                    event['end'] = {'dateTime': end_rfc, 'timeZone': 'UTC'}
+                    end_utc = self._to_utc(end_time)
+                    end_rfc = _format_rfc3339(end_utc)
+                    event['end'] = {'dateTime': end_rfc, 'timeZone': 'UTC', 'date': None}
             
-            # Update event
-            updated_event = self.service.events().update(
-                calendarId=constants.CALENDAR_ID,
+            # Update event; the response is the full updated resource
+            updated_event = events.patch(
+                calendarId=calendar_id,
                 eventId=event_id,
                 body=event
             ).execute()
@@ -184,6 +238,7 @@ class CalendarManagementAgent:
                 'success': True,
                 'event_id': updated_event.get('id'),
                 'summary': updated_event.get('summary'),
+                'event': updated_event,
                 'message': f"Event '{updated_event.get('summary')}' updated successfully"
             }
             
@@ -212,101 +267,147 @@ class CalendarManagementAgent:
         Returns:
             List of conflicting events
         """
+        return self.check_conflicts_bulk([(start_time, end_time, exclude_event_id)])[0]
+    
+    def check_conflicts_bulk(self, intervals: List[Tuple[datetime, datetime, Optional[str]]]) -> List[List[Dict[str, Any]]]:
+        """
+        Check several time ranges for conflicts in a single batch HTTP request.
+        
+        Args:
+            intervals: List of (start_time, end_time, exclude_event_id) tuples (times in user timezone)
+        
+        Returns:
+            List of conflict lists, in the same order as intervals
+        """
+        # On error, report no conflicts (don't block on conflict check errors)
+        results: List[List[Dict[str, Any]]] = [[] for _ in intervals]
+        
         try:
             # Convert to UTC for API query
-            if self.timezone_manager:
-                start_utc = self.timezone_manager.convert_to_utc(start_time)
-                end_utc = self.timezone_manager.convert_to_utc(end_time)
-            else:
-                start_utc = start_time.astimezone(timezone.utc) if start_time.tzinfo else start_time
-                end_utc = end_time.astimezone(timezone.utc) if end_time.tzinfo else end_time
+            bounds = [(self._to_utc(start_time), self._to_utc(end_time), exclude_event_id)
+                      for start_time, end_time, exclude_event_id in intervals]
             
-            # Query calendar for events in this time range
-            start_rfc = start_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
-            end_rfc = end_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
+            def on_list(request_id, events_result, exception):
+                if exception is not None:
+                    return
+                index = int(request_id)
+                start_utc, end_utc, exclude_event_id = bounds[index]
+                results[index] = self._find_overlaps(events_result.get('items', []), start_utc, end_utc, exclude_event_id)
             
-            events_result = self.service.events().list(
-                calendarId=constants.CALENDAR_ID,
-                timeMin=start_rfc,
-                timeMax=end_rfc,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
+            batch = self.service.new_batch_http_request(callback=on_list)
+            events = self.service.events()
+            calendar_id = constants.CALENDAR_ID
+            for index, (start_utc, end_utc, _) in enumerate(bounds):
+                # Query calendar for events in this time range
+                batch.add(
+                    events.list(
+                        calendarId=calendar_id,
+                        timeMin=_format_rfc3339(start_utc),
+                        timeMax=_format_rfc3339(end_utc),
+                        singleEvents=True,
+                        orderBy='startTime',
+                        maxResults=constants.CONFLICT_MAX_RESULTS,
+                        fields=constants.CONFLICT_LIST_FIELDS
+                    ),
+                    request_id=str(index)
+                )
             
-            conflicts = []
-            for event in events_result.get('items', []):
-                event_id = event.get('id')
-                # Skip the event being modified
-                if exclude_event_id and event_id == exclude_event_id:
-                    continue
-                
-                # Check if events actually overlap
-                event_start_str = event['start'].get('dateTime', event['start'].get('date'))
-                event_end_str = event['end'].get('dateTime', event['end'].get('date'))
-                
-                if 'T' in event_start_str:
-                    event_start = datetime.fromisoformat(event_start_str.replace('Z', '+00:00'))
-                    event_end = datetime.fromisoformat(event_end_str.replace('Z', '+00:00'))
-                else:
-                    event_start = datetime.fromisoformat(event_start_str).replace(tzinfo=timezone.utc)
-                    event_end = datetime.fromisoformat(event_end_str).replace(tzinfo=timezone.utc)
-                
-                # Check overlap: new event starts before existing ends AND new event ends after existing starts
-                if start_utc < event_end and end_utc > event_start:
-                    conflicts.append({
-                        'id': event_id,
-                        'summary': event.get('summary', 'Untitled Event'),
-                        'start': event_start,
-                        'end': event_end,
-                        'location': event.get('location', '')
-                    })
-            
-            return conflicts
+            batch.execute()
             
         except Exception as e:
-            # On error, return empty list (don't block on conflict check errors)
-            return []
+            return [[] for _ in intervals]
+        
+        return results
+    
+    def _find_overlaps(self, items: List[Dict[str, Any]], start_utc: datetime, end_utc: datetime,
+                       exclude_event_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Return the listed events that actually overlap [start_utc, end_utc)."""
+        # At most CONFLICT_MAX_RESULTS items per window, too few for vectorizing to pay off
+        conflicts = []
+        append = conflicts.append
+        for event in items:
+            event_id = event.get('id')
+            # Skip the event being modified
+            if exclude_event_id and event_id == exclude_event_id:
+                continue
+            
+            # Check if events actually overlap
+            start = event['start']
+            end = event['end']
+            event_start_str = start.get('dateTime') or start.get('date')
+            event_end_str = end.get('dateTime') or end.get('date')
+            
+            if 'T' in event_start_str:
+                event_start = _parse_rfc3339(event_start_str)
+                event_end = _parse_rfc3339(event_end_str)
+            else:
+                event_start = datetime.fromisoformat(event_start_str).replace(tzinfo=timezone.utc)
+                event_end = datetime.fromisoformat(event_end_str).replace(tzinfo=timezone.utc)
+            
+            # Check overlap: new event starts before existing ends AND new event ends after existing starts
+            if start_utc < event_end and end_utc > event_start:
+                append({
+                    'id': event_id,
+                    'summary': event.get('summary', 'Untitled Event'),
+                    'start': event_start,
+                    'end': event_end,
+                    'location': event.get('location', '')
+                })
+        
+        return conflicts
     
-    def cancel_event(self, event_id: str) -> Dict[str, Any]:
+    def cancel_event(self, event_id: str, summary: Optional[str] = None) -> Dict[str, Any]:
         """
         Cancel/delete a calendar event.
         
         Args:
             event_id: ID of event to cancel
+            summary: Event title for the result message, if the caller already has it
+                     (avoids fetching the event before deleting it)
         
         Returns:
             Dictionary with success status
         """
         try:
-            print(f"Cancelling event ID: {event_id}")
-            
-            # Get event summary before deleting
-            event = self.service.events().get(calendarId=constants.CALENDAR_ID, eventId=event_id).execute()
-            summary = event.get('summary', 'Event')
-            print(f"Found event: {summary}")
+            logger.debug("Cancelling event ID: %s", event_id)
             
             # Delete event
             self.service.events().delete(calendarId=constants.CALENDAR_ID, eventId=event_id).execute()
-            print(f"Event deleted from Google Calendar")
+            logger.debug("Event deleted from Google Calendar")
             
             return {
                 'success': True,
                 'event_id': event_id,
-                'message': f"Event '{summary}' cancelled successfully"
+                'message': f"Event '{summary}' cancelled successfully" if summary else "Event cancelled successfully"
             }
             
         except HttpError as error:
-            print(f"HTTP Error cancelling event: {error}")
+            logger.error("HTTP Error cancelling event: %s", error)
             return {
                 'success': False,
                 'error': str(error),
                 'message': f"Failed to cancel event: {error}"
             }
         except Exception as e:
-            print(f"Exception cancelling event: {e}")
+            logger.error("Exception cancelling event: %s", e)
             return {
                 'success': False,
                 'error': str(e),
                 'message': f"Error cancelling event: {str(e)}"
             }
-
+    
+    async def acreate_event(self, *args, **kwargs) -> Dict[str, Any]:
+        """Async version of create_event; the API call runs on a worker thread."""
+        return await asyncio.to_thread(self.create_event, *args, **kwargs)
+    
+    async def amodify_event(self, *args, **kwargs) -> Dict[str, Any]:
+        """Async version of modify_event; the API calls run on a worker thread."""
+        return await asyncio.to_thread(self.modify_event, *args, **kwargs)
+    
+    async def acheck_conflicts(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """Async version of check_conflicts; the API call runs on a worker thread."""
+        return await asyncio.to_thread(self.check_conflicts, *args, **kwargs)
+    
+    async def acancel_event(self, event_id: str, summary: Optional[str] = None) -> Dict[str, Any]:
+        """Async version of cancel_event; the API call runs on a worker thread."""
+        return await asyncio.to_thread(self.cancel_event, event_id, summary)
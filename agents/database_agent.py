@@ -1,8 +1,12 @@
 """Agent for querying the events database."""
 import sqlite3
 import json
-from typing import List, Dict, Any
-from datetime import datetime
+import re
+import threading
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import List, Any, Optional
+from datetime import datetime, timezone
 import sys
 import os
 
@@ -12,6 +16,38 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
+from database import connect
+
+# Columns read from each events row, in the order _event_builder unpacks them
+EVENT_COLUMNS = ('id', 'summary', 'description', 'start_time', 'end_time',
+                 'location', 'attendees', 'status', 'html_link')
+_LIMIT_RE = re.compile(r'\blimit\b', re.IGNORECASE)
+EVENTS_BETWEEN_SQL = (
+    f"SELECT {', '.join(EVENT_COLUMNS)} FROM events "
+    "WHERE start_time < ? AND end_time > ? ORDER BY start_time LIMIT ?"
+)
+EVENT_BY_ID_SQL = f"SELECT {', '.join(EVENT_COLUMNS)} FROM events WHERE id = ?"
+
+
+@dataclass(slots=True)
+class Event:
+    """An events row, with start/end parsed (in the user timezone when one is set)."""
+    id: str
+    summary: str
+    description: str
+    start: datetime
+    end: datetime
+    location: str
+    attendees: list
+    status: str
+    htmlLink: str
+    
+    # Mapping-style access for callers that still treat events as dicts
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
 
 
 class DatabaseAgent:
@@ -29,67 +65,138 @@ class DatabaseAgent:
             db_path = constants.DB_PATH
         self.db_path = db_path
         self.timezone_manager = timezone_manager
+        
+        # One connection for the agent's lifetime instead of reopening per query
+        self._conn = connect(db_path)
+        self._lock = threading.Lock()
     
-    def execute_query(self, sql_query: str, print_raw: bool = True) -> List[Dict[str, Any]]:
+    def _event_builder(self, pick=None):
+        """
+        Return a function converting an events row to an Event.
+        
+        Attribute lookups are resolved once here rather than per row.
+        
+        Args:
+            pick: Optional callable returning the EVENT_COLUMNS values of a row
+                  (rows are assumed to already be in EVENT_COLUMNS order if omitted)
+        """
+        # Timestamps are stored in SQLite format (YYYY-MM-DD HH:MM:SS), in UTC.
+        # Convert from UTC to user timezone if timezone_manager is available;
+        # otherwise fromisoformat handles both ISO and SQLite (space-separated) formats.
+        parse = self.timezone_manager.parse_from_sqlite if self.timezone_manager else datetime.fromisoformat
+        json_loads = json.loads
+        
+        def build(row) -> Event:
+            event_id, summary, description, start_str, end_str, location, attendees, status, html_link = (
+                pick(row) if pick else row
+            )
+            return Event(
+                event_id,
+                summary,
+                description,
+                parse(start_str),
+                parse(end_str),
+                location,
+                json_loads(attendees) if attendees and attendees != '[]' else [],
+                status,
+                html_link
+            )
+        
+        return build
+    
+    def _to_sqlite(self, dt: datetime) -> str:
+        """Format a datetime as a UTC SQLite timestamp, comparable with the stored values."""
+        if self.timezone_manager:
+            return self.timezone_manager.format_for_sqlite(dt)
+        if dt.tzinfo:
+            dt = dt.astimezone(timezone.utc)
+        return dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    def execute_query(self, sql_query: str, print_raw: bool = True, limit: int = None) -> List[Event]:
         """
         Execute SQL query and return results.
         
         Args:
             sql_query: SQL SELECT query string
             print_raw: Whether to print raw SQL output
+            limit: Maximum number of rows to return; applied in SQL unless the query has its own LIMIT
         
         Returns:
-            List of event dictionaries
+            List of Event objects
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            params = ()
+            if limit is not None and not _LIMIT_RE.search(sql_query):
+                sql_query = f"SELECT * FROM ({sql_query.strip().rstrip(';')}) LIMIT ?"
+                params = (limit,)
             
-            cursor.execute(sql_query)
-            rows = cursor.fetchall()
+            with self._lock:
+                cursor = self._conn.execute(sql_query, params)
+                rows = cursor.fetchall()
             
             # Don't print raw SQL output here - orchestrator will handle conversational output
             
-            events = []
-            for row in rows:
-                # Parse timestamp from SQLite format (YYYY-MM-DD HH:MM:SS) - stored in UTC
-                start_str = row['start_time']
-                end_str = row['end_time']
-                
-                # Convert to datetime - handle both ISO and SQLite formats
-                if 'T' in start_str:
-                    start_dt = datetime.fromisoformat(start_str)
-                else:
-                    start_dt = datetime.strptime(start_str, '%Y-%m-%d %H:%M:%S')
-                
-                if 'T' in end_str:
-                    end_dt = datetime.fromisoformat(end_str)
-                else:
-                    end_dt = datetime.strptime(end_str, '%Y-%m-%d %H:%M:%S')
-                
-                # Convert from UTC to user timezone if timezone_manager is available
-                if self.timezone_manager:
-                    start_dt = self.timezone_manager.parse_from_sqlite(start_str)
-                    end_dt = self.timezone_manager.parse_from_sqlite(end_str)
-                
-                event = {
-                    'id': row['id'],
-                    'summary': row['summary'],
-                    'description': row['description'],
-                    'start': start_dt,
-                    'end': end_dt,
-                    'location': row['location'],
-                    'attendees': json.loads(row['attendees']) if row['attendees'] else [],
-                    'status': row['status'],
-                    'htmlLink': row['html_link']
-                }
-                events.append(event)
+            # Generated SQL may select columns in any order, so locate them once per query
+            positions = {column[0]: i for i, column in enumerate(cursor.description)}
+            pick = itemgetter(*(positions[name] for name in EVENT_COLUMNS))
             
-            conn.close()
-            return events
+            return list(map(self._event_builder(pick), rows))
             
         except Exception as e:
             print(f"Error executing query: {e}")
             return []
-
+    
+    def events_between(self, t0: datetime, t1: datetime, limit: int = 200) -> List[Event]:
+        """
+        Get events overlapping a time range.
+        
+        Stored timestamps are fixed-width UTC strings, so they compare in time
+        order and the (start_time, end_time) index serves the range scan.
+        
+        Args:
+            t0: Range start (timezone-aware, or naive in the user's timezone)
+            t1: Range end
+            limit: Maximum number of events to return
+        
+        Returns:
+            List of Event objects ordered by start time
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    EVENTS_BETWEEN_SQL,
+                    (self._to_sqlite(t1), self._to_sqlite(t0), limit)
+                ).fetchall()
+            return list(map(self._event_builder(), rows))
+            
+        except Exception as e:
+            print(f"Error querying events: {e}")
+            return []
+    
+    def get_event_by_id(self, event_id: str) -> Optional[Event]:
+        """
+        Get one event by its Google Calendar ID.
+        
+        The ID is bound as a parameter, so the statement text is constant and
+        sqlite3's statement cache reuses its compiled form.
+        
+        Returns:
+            The Event, or None if it is not stored (or on error)
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(EVENT_BY_ID_SQL, (event_id,)).fetchone()
+            return self._event_builder()(row) if row else None
+            
+        except Exception as e:
+            print(f"Error querying event: {e}")
+            return None
+    
+    def close(self):
+        """Refresh planner statistics and close the database connection."""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+            self._conn.close()
@@ -0,0 +1,108 @@
+"""Shared Groq clients, so every agent reuses one connection pool."""
+import atexit
+import importlib.util
+import logging
+import os
+import sys
+import threading
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+
+# Add parent directory to path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+import constants
+
+# groq pulls in httpx and pydantic; import them on first client creation, not at startup
+if TYPE_CHECKING:
+    from groq import Groq, AsyncGroq
+
+# Loaded once here for every agent that talks to Groq
+load_dotenv()
+
+# HTTP/2 lets concurrent async calls multiplex over one connection; needs the optional h2 package
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_client = None
+_aclient = None
+
+
+def _api_key() -> str:
+    """Read the Groq API key from the environment."""
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not found")
+    return api_key
+
+
+def get_client() -> "Groq":
+    """Return the process-wide sync Groq client, creating it on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            import httpx
+            from groq import Groq
+            _client = Groq(
+                api_key=_api_key(),
+                http_client=httpx.Client(limits=httpx.Limits(
+                    max_connections=constants.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=constants.HTTP_MAX_KEEPALIVE_CONNECTIONS
+                ))
+            )
+        return _client
+
+
+def get_async_client() -> "AsyncGroq":
+    """Return the process-wide AsyncGroq client, creating it on first use."""
+    global _aclient
+    with _lock:
+        if _aclient is None:
+            import httpx
+            from groq import AsyncGroq
+            # Long-lived pooled HTTP client so concurrent async calls reuse connections
+            _aclient = AsyncGroq(
+                api_key=_api_key(),
+                http_client=httpx.AsyncClient(
+                    http2=HTTP2_AVAILABLE,
+                    limits=httpx.Limits(
+                        max_connections=constants.HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=constants.HTTP_MAX_KEEPALIVE_CONNECTIONS
+                    )
+                )
+            )
+        return _aclient
+
+
+def warm_up():
+    """Open the sync client's pooled connection (TLS handshake included) ahead of the first real call."""
+    try:
+        # Listing models costs no tokens
+        get_client().models.list()
+    except Exception as e:
+        logger.debug("Groq warm-up failed: %s", e)
+
+
+def close():
+    """Close the sync client's connections (registered to run at exit)."""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+async def aclose():
+    """Close the async client's connections; await on the loop that used it before it shuts down."""
+    global _aclient
+    with _lock:
+        client, _aclient = _aclient, None
+    if client is not None:
+        await client.close()
+
+
+atexit.register(close)
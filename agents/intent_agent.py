@@ -1,8 +1,10 @@
 """Agent for identifying user intent."""
+import logging
 import os
+import re
 import sys
-from groq import Groq
-from dotenv import load_dotenv
+import threading
+from collections import OrderedDict
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,18 +12,92 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
+from agents.groq_client import get_client, get_async_client
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+VALID_INTENTS = ('query', 'create', 'modify', 'cancel', 'quit')
+
+# Unambiguous phrasings that don't need an LLM call, checked in order
+FAST_PATH_PATTERNS = (
+    ('quit', re.compile(r"^(q|quit|exit|stop|bye|goodbye|done|i'?m done)[.!]*$")),
+    ('cancel', re.compile(r'^(cancel|delete|remove|drop)\b')),
+    ('modify', re.compile(r'^(reschedule|move|shift|change|update|modify)\b')),
+    ('create', re.compile(r'^(schedule|create|book|set up)\b')),
+    ('query', re.compile(r"^(show|list|what|what's|when|do i have|are there|any)\b")),
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Classification doesn't depend on the user, so one LRU of normalized query -> intent
+# serves every IntentAgent (one per session) in the process
+_intent_cache = OrderedDict()
+_intent_cache_lock = threading.Lock()
+
+# Static classification instructions, built once; only the user query varies per call
+INTENT_SYSTEM_MSG = {"role": "system", "content": """You are an intent classifier. Return only the intent word.
+
+Classify the user's intent into one of these categories:
+- 'query': User wants information about events (e.g., "show events", "what's on my calendar", "events tomorrow")
+- 'create': User wants to create a new event (e.g., "schedule a meeting", "create event", "add appointment")
+- 'modify': User wants to modify an existing event (e.g., "change time", "update event", "reschedule")
+- 'cancel': User wants to cancel/delete an event (e.g., "cancel meeting", "delete event", "remove appointment")
+- 'quit': User wants to stop/exit/quit the application (e.g., "quit", "exit", "stop", "bye", "goodbye", "I'm done")"""}
 
 
 class IntentAgent:
     """Identifies user intent from natural language."""
     
     def __init__(self):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
+        self.client = get_client()
+        self.aclient = get_async_client()
+    
+    def _request(self, user_query: str) -> dict:
+        """Keyword arguments for the chat completion call."""
+        return dict(
+            model=constants.LLM_MODEL,
+            messages=[
+                INTENT_SYSTEM_MSG,
+                {"role": "user", "content": f'User query: "{user_query}"\n\nReturn ONLY one word: query, create, modify, cancel, or quit'}
+            ],
+            temperature=constants.INTENT_AGENT_TEMPERATURE,
+            max_tokens=constants.INTENT_AGENT_MAX_TOKENS,
+            stream=True
+        )
+    
+    def _first_intent(self, content: str):
+        """Return the intent if the streamed text so far starts with a valid intent word, else None."""
+        words = content.strip().lower().split()
+        if words:
+            word = words[0].strip('\'".,!')
+            if word in VALID_INTENTS:
+                return word
+        return None
+    
+    @staticmethod
+    def _normalize(user_query: str) -> str:
+        """Cache key for a query: lowercased, with runs of whitespace collapsed."""
+        return _WHITESPACE_RE.sub(' ', user_query.strip().lower())
+    
+    def _lookup(self, normalized: str):
+        """Return the intent from the fast-path patterns or the LRU, or None."""
+        for intent, pattern in FAST_PATH_PATTERNS:
+            if pattern.match(normalized):
+                logger.debug("Intent fast path: %r -> %s", normalized, intent)
+                return intent
+        
+        with _intent_cache_lock:
+            if normalized in _intent_cache:
+                _intent_cache.move_to_end(normalized)
+                return _intent_cache[normalized]
+        return None
+    
+    def _remember(self, normalized: str, intent: str):
+        """Store an LLM-classified intent, evicting the oldest entry if full."""
+        with _intent_cache_lock:
+            _intent_cache[normalized] = intent
+            _intent_cache.move_to_end(normalized)
+            if len(_intent_cache) > constants.INTENT_CACHE_MAXSIZE:
+                _intent_cache.popitem(last=False)
     
     def identify_intent(self, user_query: str) -> str:
         """
@@ -33,39 +109,60 @@ class IntentAgent:
         Returns:
             Intent string: 'query', 'create', 'modify', 'cancel', or 'quit'
         """
-        prompt = f"""Classify the user's intent into one of these categories:
-- 'query': User wants information about events (e.g., "show events", "what's on my calendar", "events tomorrow")
-- 'create': User wants to create a new event (e.g., "schedule a meeting", "create event", "add appointment")
-- 'modify': User wants to modify an existing event (e.g., "change time", "update event", "reschedule")
-- 'cancel': User wants to cancel/delete an event (e.g., "cancel meeting", "delete event", "remove appointment")
-- 'quit': User wants to stop/exit/quit the application (e.g., "quit", "exit", "stop", "bye", "goodbye", "I'm done")
-
-User query: "{user_query}"
-
-Return ONLY one word: query, create, modify, cancel, or quit"""
-
+        normalized = self._normalize(user_query)
+        intent = self._lookup(normalized)
+        if intent:
+            return intent
+        
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an intent classifier. Return only the intent word."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.INTENT_AGENT_TEMPERATURE,
-                max_tokens=constants.INTENT_AGENT_MAX_TOKENS
-            )
-            
-            intent = response.choices[0].message.content.strip().lower()
-            
-            # Validate intent
-            valid_intents = ['query', 'create', 'modify', 'cancel', 'quit']
-            if intent not in valid_intents:
-                # Default to query if unclear
-                return 'query'
+            # Only one word is needed, so stop reading as soon as it arrives
+            stream = self.client.chat.completions.create(**self._request(user_query))
+            content = ''
+            try:
+                for chunk in stream:
+                    content += chunk.choices[0].delta.content or ''
+                    if self._first_intent(content):
+                        break
+            finally:
+                stream.close()
+            intent = self._first_intent(content)
             
+        except Exception as e:
+            # Default to query on error (not cached)
+            return 'query'
+        
+        if intent is None:
+            # Default to query if unclear; not cached, so the next ask gets a fresh answer
+            return 'query'
+        self._remember(normalized, intent)
+        return intent
+    
+    async def aidentify_intent(self, user_query: str) -> str:
+        """Async version of identify_intent."""
+        normalized = self._normalize(user_query)
+        intent = self._lookup(normalized)
+        if intent:
             return intent
+        
+        try:
+            # Only one word is needed, so stop reading as soon as it arrives
+            stream = await self.aclient.chat.completions.create(**self._request(user_query))
+            content = ''
+            try:
+                async for chunk in stream:
+                    content += chunk.choices[0].delta.content or ''
+                    if self._first_intent(content):
+                        break
+            finally:
+                await stream.close()
+            intent = self._first_intent(content)
             
         except Exception as e:
-            # Default to query on error
+            # Default to query on error (not cached)
             return 'query'
-
+        
+        if intent is None:
+            # Default to query if unclear; not cached, so the next ask gets a fresh answer
+            return 'query'
+        self._remember(normalized, intent)
+        return intent
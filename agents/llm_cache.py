@@ -0,0 +1,336 @@
+"""Caches for LLM responses."""
+import os
+import re
+import sys
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+# Add parent directory to path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+# Words and numbers in a query must match exactly for a cache hit, since embeddings of
+# "3pm"/"4pm", "today"/"tomorrow" or "dentist"/"doctor" are nearly identical. Only
+# filler and command words are left for the embedding to match as paraphrases.
+_TOKEN_RE = re.compile(r'[a-z]+|\d+')
+_PARAPHRASE_WORDS = frozenset({
+    'a', 'an', 'the', 'my', 'me', 'i', 's', 'do', 'have', 'is', 'are', 'what', 'please',
+    'can', 'could', 'would', 'you', 'on', 'at', 'for', 'in', 'to', 'of', 'any', 'all',
+    'show', 'list', 'tell', 'give', 'get', 'find', 'check', 'see', 'display',
+    'create', 'add', 'book', 'set', 'up', 'make', 'put', 'schedule', 'calendar', 'event', 'events',
+})
+
+
+def context_hash(*parts) -> str:
+    """Hash the context a cached response depends on (date, event IDs, ...)."""
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_name: str):
+    """Load a sentence-transformers model once per process, shared by every SemanticCache."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class _SemanticStore:
+    """Embedding index for one cache file, shared by every SemanticCache in the process."""
+
+    def __init__(self, db_path: str, maxsize: int, np):
+        self.maxsize = maxsize
+        self._np = np
+        self.lock = threading.Lock()
+        # full context hash -> (embedding matrix, list of response dicts), rows oldest first
+        self.index = {}
+        # full context hash of every row, oldest first, for FIFO eviction
+        self._order = deque()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_table()
+        self._load()
+
+    def _create_table(self):
+        """Create cache table."""
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                embedding BLOB NOT NULL,
+                query TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                response_json TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_semantic_context ON semantic_cache(context_hash)')
+        self._conn.commit()
+
+    def _trim(self):
+        """Delete all but the newest maxsize rows from the table."""
+        self._conn.execute(
+            'DELETE FROM semantic_cache WHERE rowid NOT IN '
+            '(SELECT rowid FROM semantic_cache ORDER BY rowid DESC LIMIT ?)',
+            (self.maxsize,)
+        )
+        self._conn.commit()
+
+    def _load(self):
+        """Load cached embeddings into memory, stacked per context hash."""
+        np = self._np
+        self._trim()
+        rows = self._conn.execute(
+            'SELECT context_hash, embedding, response_json FROM semantic_cache ORDER BY rowid'
+        ).fetchall()
+
+        grouped = {}
+        for ctx, blob, response_json in rows:
+            embeddings, responses = grouped.setdefault(ctx, ([], []))
+            embeddings.append(np.frombuffer(blob, dtype=np.float32))
+            responses.append(json.loads(response_json))
+            self._order.append(ctx)
+
+        for ctx, (embeddings, responses) in grouped.items():
+            self.index[ctx] = (np.vstack(embeddings), responses)
+
+    def add(self, query: str, full_ctx: str, embedding, response: dict):
+        """Persist and index one entry, evicting the oldest entries past maxsize."""
+        np = self._np
+        with self.lock:
+            try:
+                self._conn.execute(
+                    'INSERT INTO semantic_cache (embedding, query, context_hash, response_json, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (embedding.tobytes(), query, full_ctx, json.dumps(response), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Error storing semantic cache entry: %s", e)
+
+            if full_ctx in self.index:
+                matrix, responses = self.index[full_ctx]
+                self.index[full_ctx] = (np.vstack([matrix, embedding]), responses + [dict(response)])
+            else:
+                self.index[full_ctx] = (embedding.reshape(1, -1), [dict(response)])
+            self._order.append(full_ctx)
+
+            if len(self._order) <= self.maxsize:
+                return
+            # The oldest row overall is always the first row of its context's matrix
+            while len(self._order) > self.maxsize:
+                oldest = self._order.popleft()
+                matrix, responses = self.index[oldest]
+                if len(responses) == 1:
+                    del self.index[oldest]
+                else:
+                    self.index[oldest] = (matrix[1:], responses[1:])
+            try:
+                self._trim()
+            except sqlite3.Error as e:
+                logger.warning("Error evicting semantic cache entries: %s", e)
+
+
+# db_path -> _SemanticStore, so every agent and session shares one index per cache file
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(db_path: str, np) -> _SemanticStore:
+    """Return the process-wide store for db_path, loading it on first use."""
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = _SemanticStore(db_path, constants.SEMANTIC_CACHE_MAXSIZE, np)
+        return store
+
+
+class SemanticCache:
+    """Caches parsed LLM responses keyed by a sentence embedding of the user query."""
+
+    def __init__(self, db_path: str = None, threshold: float = None, model_name: str = None):
+        """
+        Initialize semantic cache.
+
+        Args:
+            db_path: Path to SQLite cache file (defaults to constants.LLM_CACHE_DB_PATH)
+            threshold: Minimum cosine similarity for a cache hit (defaults to constants.SEMANTIC_CACHE_THRESHOLD)
+            model_name: sentence-transformers model name (defaults to constants.SEMANTIC_CACHE_MODEL)
+        """
+        self.db_path = db_path or constants.LLM_CACHE_DB_PATH
+        self.threshold = threshold if threshold is not None else constants.SEMANTIC_CACHE_THRESHOLD
+        model_name = model_name or constants.SEMANTIC_CACHE_MODEL
+
+        try:
+            import numpy as np
+            self._np = np
+            self.model = _load_model(model_name)
+            self._store = _get_store(self.db_path, np)
+            self.available = True
+        except ImportError:
+            self.available = False
+            logger.warning("sentence-transformers not installed. Semantic cache will be disabled.")
+        except Exception as e:
+            self.available = False
+            logger.warning("Semantic cache initialization failed: %s", e)
+
+    def _full_context(self, query: str, ctx: str) -> str:
+        """Combine the caller's context hash with the content words and numbers in the query."""
+        tokens = _TOKEN_RE.findall(query.lower())
+        return context_hash(ctx, *(token for token in tokens if token not in _PARAPHRASE_WORDS))
+
+    def _embed(self, query: str):
+        """Embed query as a normalized float32 vector."""
+        return self.model.encode(query.strip().lower(), normalize_embeddings=True).astype(self._np.float32)
+
+    def get(self, query: str, ctx: str) -> Optional[dict]:
+        """
+        Look up a cached response for a semantically similar query.
+
+        Args:
+            query: User's natural language query
+            ctx: Context hash the response depends on
+
+        Returns:
+            Cached response dictionary, or None on miss
+        """
+        if not self.available:
+            return None
+
+        with self._store.lock:
+            entry = self._store.index.get(self._full_context(query, ctx))
+        if entry is None:
+            return None
+
+        matrix, responses = entry
+        similarities = matrix @ self._embed(query)
+        best = int(similarities.argmax())
+        if similarities[best] >= self.threshold:
+            return dict(responses[best])
+        return None
+
+    def put(self, query: str, ctx: str, response: dict):
+        """
+        Store a response for a query.
+
+        Args:
+            query: User's natural language query
+            ctx: Context hash the response depends on
+            response: Parsed response dictionary
+        """
+        if not self.available or 'error' in response:
+            return
+
+        self._store.add(query, self._full_context(query, ctx), self._embed(query), response)
+
+
+class ExactCache:
+    """Exact-match LRU cache for deterministic (temperature 0) LLM calls."""
+
+    def __init__(self, db_path: str = None, maxsize: int = None, enabled: bool = True):
+        """
+        Initialize exact-match cache.
+
+        Args:
+            db_path: Path to SQLite cache file (defaults to constants.LLM_CACHE_DB_PATH)
+            maxsize: Maximum number of in-memory entries (defaults to constants.EXACT_CACHE_MAXSIZE)
+            enabled: Whether the cache is active (only safe for deterministic calls)
+        """
+        self.db_path = db_path or constants.LLM_CACHE_DB_PATH
+        self.maxsize = maxsize or constants.EXACT_CACHE_MAXSIZE
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            self._create_table()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, system: str, prompt: str) -> str:
+        """Build cache key from everything that determines the completion."""
+        return context_hash(model, temperature, max_tokens, system, prompt)
+
+    def _create_table(self):
+        """Create cache table."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_exact_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.warning("Error creating exact cache table: %s", e)
+
+    def _remember(self, key: str, response: dict):
+        """Insert into the in-memory LRU, evicting the oldest entry if full."""
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            Cached response dictionary, or None on miss
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return dict(self._entries[key])
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            row = conn.execute('SELECT response FROM llm_exact_cache WHERE key = ?', (key,)).fetchone()
+            conn.close()
+        except Exception as e:
+            logger.warning("Error reading exact cache: %s", e)
+            return None
+
+        if row is None:
+            return None
+        response = json.loads(row[0])
+        self._remember(key, response)
+        return dict(response)
+
+    def put(self, key: str, response: dict):
+        """
+        Store a response.
+
+        Args:
+            key: Key from make_key()
+            response: Parsed response dictionary
+        """
+        if not self.enabled or 'error' in response:
+            return
+
+        self._remember(key, dict(response))
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_exact_cache (key, response, created_at) VALUES (?, ?, ?)',
+                (key, json.dumps(response), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.warning("Error storing exact cache entry: %s", e)
@@ -0,0 +1,12 @@
+"""Cleanup of raw LLM replies shared by the agents."""
+import re
+
+# Markdown code fence around a reply, closing fence optional: ```sql ... ```
+_FENCE_RE = re.compile(r"^```(?:sql|json)?\s*(.*?)\s*(?:```.*)?$", re.DOTALL | re.IGNORECASE)
+
+
+def strip_fence(content: str) -> str:
+    """Strip whitespace and a surrounding markdown code fence, if any, from an LLM reply."""
+    content = content.strip()
+    match = _FENCE_RE.match(content)
+    return match.group(1) if match else content
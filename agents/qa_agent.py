@@ -2,8 +2,6 @@
 import os
 import sys
 import json
-from groq import Groq
-from dotenv import load_dotenv
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,35 +9,26 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
-
-load_dotenv()
+from agents.groq_client import get_client, get_async_client
+from agents.time_format import format_month_day, format_time
 
 
 class QAAgent:
     """Answers questions about calendar events using LLM."""
     
     def __init__(self):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
+        self.client = get_client()
+        self.aclient = get_async_client()
     
-    def answer(self, user_query: str, events: list) -> str:
-        """
-        Answer user question about events.
-        
-        Args:
-            user_query: User's question
-            events: List of event dictionaries
-        
-        Returns:
-            Answer string
-        """
+    def _request(self, user_query: str, events: list) -> dict:
+        """Keyword arguments for the chat completion call."""
         # Format events for prompt
-        events_text = ""
+        lines = []
+        append = lines.append
         for event in events[:constants.MAX_EVENTS_FOR_QA]:
             start = event['start'].astimezone() if event['start'].tzinfo else event['start']
-            events_text += f"- {event['summary']} on {start.strftime('%B %d at %I:%M %p')}\n"
+            append(f"- {event['summary']} on {format_month_day(start)} at {format_time(start)}\n")
+        events_text = ''.join(lines)
         
         prompt = f"""Answer this question about calendar events:
 
@@ -50,19 +39,39 @@ Events:
 
 Provide a clear, concise answer."""
 
+        return dict(
+            model=constants.LLM_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful calendar assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=constants.LLM_TEMPERATURE,
+            max_tokens=constants.LLM_MAX_TOKENS
+        )
+    
+    def answer(self, user_query: str, events: list) -> str:
+        """
+        Answer user question about events.
+        
+        Args:
+            user_query: User's question
+            events: List of event dictionaries
+        
+        Returns:
+            Answer string
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful calendar assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
-            )
+            response = self.client.chat.completions.create(**self._request(user_query, events))
+            return response.choices[0].message.content.strip()
             
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    async def aanswer(self, user_query: str, events: list) -> str:
+        """Async version of answer."""
+        try:
+            response = await self.aclient.chat.completions.create(**self._request(user_query, events))
             return response.choices[0].message.content.strip()
             
         except Exception as e:
             return f"Error: {str(e)}"
-
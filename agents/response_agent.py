@@ -2,9 +2,7 @@
 import os
 import sys
 import json
-from typing import List, Dict, Any
-from groq import Groq
-from dotenv import load_dotenv
+from typing import List
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -12,39 +10,31 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
-
-load_dotenv()
+from agents.groq_client import get_client, get_async_client
+from agents.database_agent import Event
+from agents.time_format import format_month_day, format_time
 
 
 class ResponseAgent:
     """Generates conversational responses from SQL query results using LLM."""
     
     def __init__(self):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
+        self.client = get_client()
+        self.aclient = get_async_client()
     
-    def generate_response(self, user_query: str, events: List[Dict[str, Any]]) -> str:
-        """
-        Generate conversational response from query results.
-        
-        Args:
-            user_query: Original user query
-            events: List of event dictionaries from SQL query
-        
-        Returns:
-            Conversational response string
-        """
+    def _request(self, user_query: str, events: List[Event]) -> dict:
+        """Keyword arguments for the chat completion call."""
         # Format events for prompt
-        events_text = ""
+        lines = []
+        append = lines.append
         for event in events[:constants.MAX_EVENTS_FOR_RESPONSE]:
-            start = event['start']
-            end = event['end']
-            events_text += f"- {event['summary']} on {start.strftime('%B %d')} from {start.strftime('%I:%M %p')} to {end.strftime('%I:%M %p')}"
-            if event.get('location'):
-                events_text += f" at {event['location']}"
-            events_text += "\n"
+            start = event.start
+            end = event.end
+            line = f"- {event.summary} on {format_month_day(start)} from {format_time(start)} to {format_time(end)}"
+            if event.location:
+                line += f" at {event.location}"
+            append(line + "\n")
+        events_text = ''.join(lines)
         
         prompt = f"""User asked: "{user_query}"
 
@@ -53,23 +43,48 @@ Query results:
 
 Generate a natural, conversational response to the user's question based on these results. Be concise and friendly."""
 
+        return dict(
+            model=constants.LLM_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful calendar assistant. Provide natural, conversational responses."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=constants.LLM_TEMPERATURE,
+            max_tokens=constants.LLM_MAX_TOKENS
+        )
+    
+    def _fallback(self, events: List[Event]) -> str:
+        """Simple response when the LLM call fails."""
+        if events:
+            return f"Found {len(events)} event(s) matching your query."
+        else:
+            return "I don't see any events matching your request."
+    
+    def generate_response(self, user_query: str, events: List[Event]) -> str:
+        """
+        Generate conversational response from query results.
+        
+        Args:
+            user_query: Original user query
+            events: List of Event objects from DatabaseAgent
+        
+        Returns:
+            Conversational response string
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful calendar assistant. Provide natural, conversational responses."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
-            )
+            response = self.client.chat.completions.create(**self._request(user_query, events))
+            return response.choices[0].message.content.strip()
             
+        except Exception as e:
+            # Fallback to simple response
+            return self._fallback(events)
+    
+    async def agenerate_response(self, user_query: str, events: List[Event]) -> str:
+        """Async version of generate_response."""
+        try:
+            response = await self.aclient.chat.completions.create(**self._request(user_query, events))
             return response.choices[0].message.content.strip()
             
         except Exception as e:
             # Fallback to simple response
-            if events:
-                return f"Found {len(events)} event(s) matching your query."
-            else:
-                return "I don't see any events matching your request."
-
+            return self._fallback(events)
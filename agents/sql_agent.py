@@ -1,10 +1,15 @@
 """Agent for converting natural language to SQL queries."""
+import asyncio
+import logging
 import os
+import re
 import sqlite3
 import sys
-from groq import Groq
-from dotenv import load_dotenv
-from typing import Optional
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from typing import List, Optional
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -12,49 +17,96 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
+from database import connect
+from agents.groq_client import get_client, get_async_client
+from agents.llm_cache import SemanticCache, context_hash
+from agents.llm_output import strip_fence
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Optional lead-in shared by the templates: "show me all my events", "meetings", ...
+_QUERY_PREFIX = r"^(?:(?:show|list|get)(?: me)? |what are )?(?:all )?(?:my )?(?:events?|meetings?)"
+
+# Common query shapes answered without an LLM call; slots are filled by _match_template
+SQL_TEMPLATES = (
+    (re.compile(_QUERY_PREFIX + r"$"),
+     "SELECT * FROM events ORDER BY start_time"),
+    (re.compile(_QUERY_PREFIX + r" (?P<day>today|tomorrow)$"),
+     "SELECT * FROM events WHERE date({start}) = {day} ORDER BY start_time"),
+    (re.compile(_QUERY_PREFIX + r" (?P<day>today|tomorrow) after (?P<hour>\d{1,2})(?::(?P<minute>\d{2}))? ?(?P<ampm>am|pm)?$"),
+     "SELECT * FROM events WHERE date({start}) = {day} AND time({start}) > '{time}' ORDER BY start_time"),
+    (re.compile(_QUERY_PREFIX + r" this week$"),
+     "SELECT * FROM events WHERE date({start}) >= {today} AND date({start}) <= {week_end} ORDER BY start_time"),
+    (re.compile(_QUERY_PREFIX + r" with (?P<name>[a-z][a-z .'-]*)$"),
+     "SELECT * FROM events WHERE attendees LIKE '%{name}%' ORDER BY start_time"),
+)
 
 
 class SQLAgent:
     """Converts natural language to SQL queries for calendar events."""
     
     def __init__(self, db_path: str = None, qa_agent=None, timezone_manager=None):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
+        self.client = get_client()
+        self.aclient = get_async_client()
         if db_path is None:
             db_path = constants.DB_PATH
         self.db_path = db_path
+        # One connection for the agent's lifetime instead of reopening per schema read
+        self._conn = connect(db_path)
+        self._conn_lock = threading.Lock()
         self.qa_agent = qa_agent
         self.timezone_manager = timezone_manager
+        # Schema text is static for the life of the process; read lazily on first use
+        self._schema_cache: Optional[str] = None
+        # System prompt (everything except the query and date); rebuilt only when the timezone or schema changes
+        self._system_prompt: Optional[str] = None
+        self._system_prompt_key: Optional[tuple] = None
+        # Generated SQL keyed by (normalized query, tz modifier, user's date, schema)
+        self._sql_cache = OrderedDict()
+        self._sql_cache_lock = threading.Lock()
+        # Paraphrases ("events today" / "what's on today") map to the same SQL; names, times and
+        # words like before/after or this/next must match exactly (see SemanticCache._full_context)
+        self.semantic_cache = SemanticCache()
+    
+    def invalidate_schema(self):
+        """Forget the cached schema so the next query re-reads it (e.g. after a migration)."""
+        self._schema_cache = None
+    
+    def close(self):
+        """Refresh planner statistics and close the database connection."""
+        with self._conn_lock:
+            try:
+                self._conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning("Error optimizing database: %s", e)
+            self._conn.close()
     
     def _get_schema(self) -> str:
-        """Dynamically read database schema."""
+        """Read database schema (cached after the first successful read)."""
+        if self._schema_cache is not None:
+            return self._schema_cache
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get table info
-            cursor.execute("PRAGMA table_info(events)")
-            columns = cursor.fetchall()
+            with self._conn_lock:
+                rows = self._conn.execute(
+                    "SELECT name, type, \"notnull\", dflt_value, pk FROM pragma_table_info('events')"
+                ).fetchall()
             
-            schema = "Table: events\nColumns:\n"
-            for col in columns:
-                col_name = col[1]
-                col_type = col[2]
-                not_null = " NOT NULL" if col[3] else ""
-                default = f" DEFAULT {col[4]}" if col[4] else ""
-                pk = " PRIMARY KEY" if col[5] else ""
-                
-                schema += f"- {col_name} ({col_type}{not_null}{default}{pk})\n"
+            lines = ["Table: events", "Columns:"]
+            lines.extend(
+                f"- {name} ({col_type}{' NOT NULL' if not_null else ''}"
+                f"{f' DEFAULT {default}' if default else ''}{' PRIMARY KEY' if pk else ''})"
+                for name, col_type, not_null, default, pk in rows
+            )
+            schema = "\n".join(lines) + "\n"
             
-            conn.close()
+            # Don't cache an empty column list (table not created yet)
+            if rows:
+                self._schema_cache = schema
             return schema
             
         except Exception as e:
-            print(f"Error reading schema: {e}")
+            logger.warning("Error reading schema: %s", e)
             # Fallback to basic schema
             return """
             Table: events
@@ -65,26 +117,79 @@ class SQLAgent:
             - end_time (TEXT)
             """
     
-    def text_to_sql(self, user_query: str, events: Optional[list] = None) -> Optional[str]:
+    def _lookup_sql(self, key: tuple) -> Optional[str]:
+        """Return previously generated SQL for this key, or None."""
+        with self._sql_cache_lock:
+            if key in self._sql_cache:
+                self._sql_cache.move_to_end(key)
+                return self._sql_cache[key]
+        return None
+    
+    def _remember_sql(self, key: tuple, sql: str):
+        """Store generated SQL, evicting the oldest entry if full."""
+        with self._sql_cache_lock:
+            self._sql_cache[key] = sql
+            self._sql_cache.move_to_end(key)
+            if len(self._sql_cache) > constants.SQL_CACHE_MAXSIZE:
+                self._sql_cache.popitem(last=False)
+    
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _sql_fragments(tz_modifier: Optional[str]) -> dict:
         """
-        Convert natural language query to SQL.
+        SQL expressions for the template slots, shifted into the user's timezone if known.
         
-        Args:
-            user_query: User's question in natural language
-            events: Optional list of events for fallback QA agent
-        
-        Returns:
-            SQL query string, or None if failed and QA agent was used
+        Memoized per modifier, which only changes with the timezone or DST; callers must copy before adding slots.
         """
-        schema = self._get_schema()
-        
-        # Get timezone info for SQL generation
-        tz_modifier = None
-        user_today = None
-        if self.timezone_manager:
-            tz_modifier = self.timezone_manager.get_sqlite_timezone_modifier()
-            user_now = self.timezone_manager.now_in_user_tz()
-            user_today = user_now.strftime('%Y-%m-%d')
+        if tz_modifier:
+            return {
+                'start': f"datetime(start_time, '{tz_modifier}')",
+                'today': f"date(datetime('now', '{tz_modifier}'))",
+                'tomorrow': f"date(datetime('now', '{tz_modifier}', '+1 day'))",
+                'week_end': f"date(datetime('now', '{tz_modifier}', '+7 days'))",
+            }
+        return {
+            'start': "start_time",
+            'today': "date('now')",
+            'tomorrow': "date('now', '+1 day')",
+            'week_end': "date('now', '+7 days')",
+        }
+    
+    def _match_template(self, normalized: str, tz_modifier: Optional[str]) -> Optional[str]:
+        """Build SQL from the first matching template, or return None."""
+        normalized = normalized.rstrip('?.!')
+        for pattern, template in SQL_TEMPLATES:
+            match = pattern.match(normalized)
+            if not match:
+                continue
+            
+            values = dict(self._sql_fragments(tz_modifier))
+            slots = match.groupdict()
+            if slots.get('day'):
+                values['day'] = values[slots['day']]
+            if slots.get('hour'):
+                # A bare "after 5" is ambiguous; leave it to the LLM
+                if not slots['ampm'] and not slots['minute']:
+                    return None
+                hour = int(slots['hour'])
+                minute = int(slots['minute'] or 0)
+                if slots['ampm'] == 'pm' and hour < 12:
+                    hour += 12
+                elif slots['ampm'] == 'am' and hour == 12:
+                    hour = 0
+                if hour > 23 or minute > 59:
+                    return None
+                values['time'] = f"{hour:02d}:{minute:02d}:00"
+            if slots.get('name'):
+                values['name'] = slots['name'].strip().replace("'", "''")
+            return template.format(**values)
+        return None
+    
+    def _get_system_prompt(self, schema: str, tz_modifier: Optional[str]) -> str:
+        """Return the static part of the prompt (instructions, schema, examples)."""
+        key = (schema, tz_modifier or '')
+        if key == self._system_prompt_key:
+            return self._system_prompt
         
         # Build timezone-aware examples
         if tz_modifier:
@@ -96,20 +201,19 @@ class SQLAgent:
             tomorrow_example = "SELECT * FROM events WHERE date(start_time) = date('now', '+1 day')"
             week_example = "SELECT * FROM events WHERE date(start_time) >= date('now') AND date(start_time) <= date('now', '+7 days')"
         
-        prompt = f"""Convert this natural language query to SQL for the events table.
+        prompt = f"""You are a SQL query generator. Return ONLY valid SQL, no explanations.
+
+Convert the user's natural language query to SQL for the events table.
 
 Schema:
 {schema}
 
-User query: "{user_query}"
-
 Return ONLY a valid SQL SELECT query. Use SQLite syntax.
 IMPORTANT: 
 - Use '+1 day' (with plus sign) for tomorrow, NOT '1 day'
 - Timestamps are stored in UTC format (YYYY-MM-DD HH:MM:SS) in the database
 - Use datetime() with timezone modifier '{tz_modifier}' to convert UTC to user timezone
 - Then use date() to extract date part for comparisons
-- Current date in user timezone: {user_today if user_today else 'unknown'}
 - Timezone modifier to use: '{tz_modifier}' (apply to both 'now' and start_time)
 
 Examples:
@@ -118,39 +222,140 @@ Examples:
 - "events tomorrow" -> {tomorrow_example}
 - "events tomorrow after 5pm" -> SELECT * FROM events WHERE date(datetime(start_time, '{tz_modifier}')) = date(datetime('now', '{tz_modifier}', '+1 day')) AND time(datetime(start_time, '{tz_modifier}')) > '17:00:00'
 - "meetings with john" -> SELECT * FROM events WHERE attendees LIKE '%john%'
-- "events this week" -> {week_example}
-
-SQL query:"""
+- "events this week" -> {week_example}"""
+        self._system_prompt, self._system_prompt_key = prompt, key
+        return prompt
+    
+    def _prepare(self, user_query: str) -> tuple:
+        """
+        Resolve the query from templates or caches, or build the LLM request.
+        
+        Returns:
+            (sql, request, cache_key, semantic_context); sql is None on a miss
+        """
+        schema = self._get_schema()
+        
+        # Get timezone info for SQL generation
+        tz_modifier = None
+        user_today = None
+        if self.timezone_manager:
+            tz_modifier = self.timezone_manager.get_sqlite_timezone_modifier()
+            user_now = self.timezone_manager.now_in_user_tz()
+            user_today = user_now.strftime('%Y-%m-%d')
+        
+        normalized = " ".join(user_query.lower().split())
+        template_sql = self._match_template(normalized, tz_modifier)
+        if template_sql is not None:
+            return template_sql, None, None, None
+        
+        # The date is part of the key so "events today" is regenerated after midnight
+        cache_key = (
+            normalized,
+            tz_modifier,
+            user_today or date.today().isoformat(),
+            schema
+        )
+        cached_sql = self._lookup_sql(cache_key)
+        if cached_sql is not None:
+            return cached_sql, None, None, None
+        
+        semantic_context = context_hash('sql', *cache_key[1:])
+        cached = self.semantic_cache.get(user_query, semantic_context)
+        if cached is not None:
+            self._remember_sql(cache_key, cached['sql'])
+            return cached['sql'], None, None, None
+        
+        # Only the query and date vary per call, so they go in their own message after the stable system prompt
+        system_prompt = self._get_system_prompt(schema, tz_modifier)
+        prompt = (
+            f'User query: "{user_query}"\n'
+            f"Current date in user timezone: {user_today if user_today else 'unknown'}\n\n"
+            "SQL query:"
+        )
+        request = dict(
+            model=constants.LLM_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=constants.LLM_TEMPERATURE,
+            max_tokens=constants.LLM_MAX_TOKENS
+        )
+        return None, request, cache_key, semantic_context
+    
+    def _store(self, user_query: str, content: str, cache_key: tuple, semantic_context: str) -> str:
+        """Clean up the generated SQL and cache it."""
+        sql = strip_fence(content)
+        
+        self._remember_sql(cache_key, sql)
+        self.semantic_cache.put(user_query, semantic_context, {'sql': sql})
+        return sql
+    
+    def text_to_sql(self, user_query: str, events: Optional[list] = None) -> Optional[str]:
+        """
+        Convert natural language query to SQL.
+        
+        Args:
+            user_query: User's question in natural language
+            events: Optional list of events for fallback QA agent
+        
+        Returns:
+            SQL query string, or None if failed and QA agent was used
+        """
+        sql, request, cache_key, semantic_context = self._prepare(user_query)
+        if sql is not None:
+            return sql
         
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a SQL query generator. Return ONLY valid SQL, no explanations."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.LLM_TEMPERATURE,
-                max_tokens=constants.LLM_MAX_TOKENS
-            )
-            
-            sql = response.choices[0].message.content.strip()
-            # Remove markdown code blocks if present
-            if sql.startswith('```'):
-                sql = sql.split('```')[1]
-                if sql.startswith('sql'):
-                    sql = sql[3:]
-                sql = sql.strip()
+            response = self.client.chat.completions.create(**request)
+            return self._store(user_query, response.choices[0].message.content, cache_key, semantic_context)
             
+        except Exception as e:
+            logger.exception("Error generating SQL")
+            # Fallback to QA agent if available
+            if self.qa_agent and events:
+                print("Using fallback QA agent...")
+                answer = self.qa_agent.answer(user_query, events)
+                print(f"\n{answer}")
+                return None
+            # Fallback: return all events
+            return "SELECT * FROM events ORDER BY start_time"
+    
+    async def atext_to_sql(self, user_query: str, events: Optional[list] = None) -> Optional[str]:
+        """Async version of text_to_sql."""
+        sql, request, cache_key, semantic_context = self._prepare(user_query)
+        if sql is not None:
             return sql
+        
+        try:
+            response = await self.aclient.chat.completions.create(**request)
+            return self._store(user_query, response.choices[0].message.content, cache_key, semantic_context)
             
         except Exception as e:
-            print(f"Error generating SQL: {e}")
+            logger.exception("Error generating SQL")
             # Fallback to QA agent if available
             if self.qa_agent and events:
                 print("Using fallback QA agent...")
-                answer = self.qa_agent.answer(user_query, events)
+                answer = await self.qa_agent.aanswer(user_query, events)
                 print(f"\n{answer}")
                 return None
             # Fallback: return all events
             return "SELECT * FROM events ORDER BY start_time"
-
+    
+    async def atext_to_sql_batch(self, queries: List[str]) -> List[Optional[str]]:
+        """
+        Convert many queries concurrently, at most BATCH_CONCURRENCY in flight.
+        
+        Args:
+            queries: User questions in natural language
+        
+        Returns:
+            SQL query strings, in the same order as queries
+        """
+        semaphore = asyncio.Semaphore(constants.BATCH_CONCURRENCY)
+        
+        async def convert(query):
+            async with semaphore:
+                return await self.atext_to_sql(query)
+        
+        return await asyncio.gather(*(convert(query) for query in queries))
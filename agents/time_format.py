@@ -0,0 +1,35 @@
+"""Fast datetime formatting for LLM prompts, and parsing of LLM-produced times.
+
+Each format function returns exactly what the noted strftime format would, using
+integer formatting instead of strftime's locale-aware path.
+"""
+from datetime import datetime
+
+MONTH_NAMES = ('', 'January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December')
+
+
+def format_time(dt: datetime) -> str:
+    """Same as dt.strftime('%I:%M %p')."""
+    hour = dt.hour
+    return f"{(hour - 1) % 12 + 1:02d}:{dt.minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def format_datetime(dt: datetime) -> str:
+    """Same as dt.strftime('%Y-%m-%d %I:%M %p')."""
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {format_time(dt)}"
+
+
+def format_month_day(dt: datetime) -> str:
+    """Same as dt.strftime('%B %d')."""
+    return f"{MONTH_NAMES[dt.month]} {dt.day:02d}"
+
+
+def parse_local_datetime(value: str) -> datetime:
+    """Parse 'YYYY-MM-DD HH:MM' (the action parser's format) like strptime('%Y-%m-%d %H:%M'), via the C fromisoformat."""
+    # fromisoformat also takes a 'T' separator, week dates, compact forms and offsets; only
+    # an exact 'YYYY-MM-DD HH:MM' layout takes the fast path, the rest goes through strptime
+    if (len(value) == 16 and value[4] == value[7] == '-' and value[10] == ' ' and value[13] == ':'
+            and value[:4].isdigit()):
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, '%Y-%m-%d %H:%M')
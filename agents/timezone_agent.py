@@ -7,8 +7,20 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-from timezone_manager import TimezoneManager
-import pytz
+from timezone_manager import TimezoneManager, timezone_names
+
+COMMON_TIMEZONES = (
+    ('UTC', 'UTC'),
+    ('America/New_York', 'Eastern Time (US)'),
+    ('America/Chicago', 'Central Time (US)'),
+    ('America/Denver', 'Mountain Time (US)'),
+    ('America/Los_Angeles', 'Pacific Time (US)'),
+    ('Europe/London', 'London'),
+    ('Europe/Paris', 'Paris'),
+    ('Asia/Kolkata', 'India'),
+    ('Asia/Tokyo', 'Tokyo'),
+    ('Australia/Sydney', 'Sydney'),
+)
 
 
 class TimezoneAgent:
@@ -17,6 +29,12 @@ class TimezoneAgent:
     def __init__(self):
         self.timezone_manager = None
     
+    @staticmethod
+    def is_valid(tz_name: str) -> bool:
+        """Check whether tz_name is a known timezone."""
+        # TimezoneManager resolves names case-insensitively, so validate the same way
+        return tz_name.lower() in timezone_names()
+    
     def ask_user_timezone(self) -> TimezoneManager:
         """
         Ask user for their timezone.
@@ -40,6 +58,10 @@ class TimezoneAgent:
                 self.timezone_manager = TimezoneManager('UTC')
                 break
             
+            if not self.is_valid(user_input):
+                print("Invalid timezone. Please try again or type 'list' for options.")
+                continue
+            
             if self.timezone_manager is None:
                 self.timezone_manager = TimezoneManager()
             
@@ -53,19 +75,7 @@ class TimezoneAgent:
     
     def _print_common_timezones(self):
         """Print common timezone options."""
-        common = [
-            ('UTC', 'UTC'),
-            ('America/New_York', 'Eastern Time (US)'),
-            ('America/Chicago', 'Central Time (US)'),
-            ('America/Denver', 'Mountain Time (US)'),
-            ('America/Los_Angeles', 'Pacific Time (US)'),
-            ('Europe/London', 'London'),
-            ('Europe/Paris', 'Paris'),
-            ('Asia/Kolkata', 'India'),
-            ('Asia/Tokyo', 'Tokyo'),
-            ('Australia/Sydney', 'Sydney'),
-        ]
         print("\nCommon timezones:")
-        for tz, desc in common:
+        for tz, desc in COMMON_TIMEZONES:
             print(f"  {tz:25} - {desc}")
 
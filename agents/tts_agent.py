@@ -1,6 +1,15 @@
 """Agent for text-to-speech using ElevenLabs."""
+import asyncio
+import hashlib
+import io
+import logging
 import os
+import shutil
 import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterator, List
 from dotenv import load_dotenv
 
 # Add parent directory to path
@@ -12,6 +21,39 @@ import constants
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Clip file name -> MP3 bytes, so replayed responses skip the ElevenLabs call and the disk read.
+# Every TTSAgent (one per session) shares it; bounded by total bytes rather than entry count
+_clip_cache = OrderedDict()
+_clip_cache_bytes = 0
+_clip_cache_lock = threading.Lock()
+
+
+def _cached_clip(name: str):
+    """Return the in-memory clip for this cache file name, or None."""
+    with _clip_cache_lock:
+        clip = _clip_cache.get(name)
+        if clip is not None:
+            _clip_cache.move_to_end(name)
+        return clip
+
+
+def _remember_clip(name: str, clip: bytes):
+    """Keep a clip in memory, evicting the least recently played ones past the byte cap."""
+    global _clip_cache_bytes
+    if len(clip) > constants.TTS_MEMORY_CLIP_MAX_BYTES:
+        return
+    with _clip_cache_lock:
+        previous = _clip_cache.pop(name, None)
+        if previous is not None:
+            _clip_cache_bytes -= len(previous)
+        _clip_cache[name] = clip
+        _clip_cache_bytes += len(clip)
+        while _clip_cache_bytes > constants.TTS_MEMORY_CACHE_MAX_BYTES:
+            _, evicted = _clip_cache.popitem(last=False)
+            _clip_cache_bytes -= len(evicted)
+
 
 class TTSAgent:
     """Handles text-to-speech using ElevenLabs."""
@@ -24,74 +66,230 @@ class TTSAgent:
         try:
             from elevenlabs.client import ElevenLabs
             self.client = ElevenLabs(api_key=api_key)
+            # The streaming endpoint sends audio as it is synthesized rather than once the clip is done;
+            # the SDK calls it convert_as_stream in 1.x and stream from 2.x
+            self._convert_stream = (getattr(self.client.text_to_speech, 'stream', None)
+                                    or self.client.text_to_speech.convert_as_stream)
             self.client_available = True
             self.api_key = api_key
-            print("TTS Agent initialized successfully")
+            logger.info("TTS Agent initialized successfully")
         except ImportError:
             self.client_available = False
-            print("Warning: elevenlabs package not installed. TTS will be disabled.")
-            print("Install with: pip install elevenlabs")
+            logger.warning("elevenlabs package not installed. TTS will be disabled. Install with: pip install elevenlabs")
         except Exception as e:
             self.client_available = False
-            print(f"Warning: TTS Agent initialization failed: {e}")
+            logger.warning("TTS Agent initialization failed: %s", e)
+        
+        # Generated clips keyed by sha256(voice|model|text), so repeated phrases skip the API
+        self._cache_dir = constants.TTS_CACHE_DIR or os.path.join(tempfile.gettempdir(), "tts_cache")
+        os.makedirs(self._cache_dir, exist_ok=True)
     
-    def generate_audio(self, text: str, voice_id: str = None, model: str = None) -> bytes:
+    def _cache_path(self, text: str, voice_id: str, model: str) -> str:
+        """Path of the cached MP3 for this text, voice and model."""
+        key = hashlib.sha256(f"{voice_id}|{model}|{text}".encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, key + ".mp3")
+    
+    def _evict_cache(self):
+        """Delete least recently used clips until the cache is under its size cap."""
+        try:
+            entries = []
+            total = 0
+            with os.scandir(self._cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.mp3'):
+                        stat = entry.stat()
+                        entries.append((stat.st_atime, stat.st_size, entry.path))
+                        total += stat.st_size
+            
+            if total <= constants.TTS_CACHE_MAX_BYTES:
+                return
+            
+            for _, size, path in sorted(entries):
+                os.remove(path)
+                total -= size
+                if total <= constants.TTS_CACHE_MAX_BYTES:
+                    break
+        except OSError as e:
+            logger.warning("Error evicting TTS cache: %s", e)
+    
+    def iter_audio(self, text: str, voice_id: str = None, model: str = None) -> Iterator[bytes]:
         """
-        Generate audio from text using ElevenLabs.
+        Generate audio from text using ElevenLabs, yielding MP3 chunks as they arrive.
+        
+        Cached clips are read back from disk; new clips are teed into the cache and
+        only kept once fully generated, so a consumer that stops early caches nothing.
         
         Args:
             text: Text to convert to speech
             voice_id: ElevenLabs voice ID (uses constant or default if None)
             model: Model to use (uses constant or default if None)
         
-        Returns:
-            Audio bytes (MP3 format)
+        Yields:
+            MP3 chunks; nothing on failure
         """
         if not self.client_available:
-            return None
+            return
         
         try:
-            voice_id = voice_id or constants.ELEVENLABS_VOICE_ID
-            model = model or constants.ELEVENLABS_MODEL
-            
             # Use default voice ID if none specified
             # You can get voice IDs from https://elevenlabs.io/app/voices
-            voice_to_use = voice_id if voice_id else constants.ELEVENLABS_VOICE_ID
+            voice_to_use = voice_id or constants.ELEVENLABS_VOICE_ID
+            # Use newer model compatible with free tier
+            model_to_use = model or constants.ELEVENLABS_MODEL
             
-            print(f"Generating audio with voice ID: {voice_to_use}, model: {model}")
-            print(f"Text length: {len(text)} characters")
+            cache_path = self._cache_path(text, voice_to_use, model_to_use)
+            clip = _cached_clip(os.path.basename(cache_path))
+            if clip is not None:
+                yield clip
+                return
             
-            # Use text_to_speech.convert which doesn't require voices_read permission
-            # Use newer model compatible with free tier
-            model_to_use = model if model else constants.ELEVENLABS_MODEL
+            if os.path.exists(cache_path):
+                try:
+                    f = open(cache_path, 'rb')
+                except OSError as e:
+                    logger.warning("Error reading TTS cache: %s", e)
+                else:
+                    with f:
+                        # Refresh the access time explicitly (noatime mounts) so eviction stays LRU
+                        os.utime(cache_path)
+                        size = os.fstat(f.fileno()).st_size
+                        logger.debug("Using cached audio: %d bytes", size)
+                        if size <= constants.TTS_MEMORY_CLIP_MAX_BYTES:
+                            clip = f.read()
+                            _remember_clip(os.path.basename(cache_path), clip)
+                            yield clip
+                        else:
+                            yield from iter(lambda: f.read(constants.TTS_STREAM_CHUNK_BYTES), b'')
+                    return
+            
+            logger.debug("Generating audio with voice ID: %s, model: %s, text length: %d characters",
+                         voice_to_use, model_to_use, len(text))
             
-            audio_generator = self.client.text_to_speech.convert(
+            # Use the text_to_speech streaming endpoint, which doesn't require voices_read permission
+            audio_generator = self._convert_stream(
                 voice_id=voice_to_use,
                 text=text,
                 model_id=model_to_use,
                 output_format="mp3_44100_128"  # MP3 format for web compatibility
             )
             
-            # Convert generator/stream to bytes
-            print("Converting audio generator to bytes...")
-            audio_chunks = []
-            for chunk in audio_generator:
-                audio_chunks.append(chunk)
-            
-            audio = b''.join(audio_chunks)
+            # Forward each chunk immediately instead of buffering the whole clip,
+            # teeing it into a temp file that becomes the cache entry once complete
+            written = 0
+            chunks = []
+            fd, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb', buffering=constants.TTS_WRITE_BUFFER_BYTES) as cache_file:
+                    for chunk in audio_generator:
+                        if chunk:
+                            cache_file.write(chunk)
+                            written += len(chunk)
+                            if written <= constants.TTS_MEMORY_CLIP_MAX_BYTES:
+                                chunks.append(chunk)
+                            yield chunk
+                if written:
+                    os.replace(temp_path, cache_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
             
-            if audio:
-                print(f"Generated {len(audio)} bytes of audio")
+            if written:
+                logger.debug("Generated %d bytes of audio", written)
+                if written <= constants.TTS_MEMORY_CLIP_MAX_BYTES:
+                    _remember_clip(os.path.basename(cache_path), b''.join(chunks))
+                self._evict_cache()
             else:
-                print("Warning: Generated audio is empty")
-            
-            return audio
+                logger.warning("Generated audio is empty")
             
         except Exception as e:
-            print(f"Error generating audio: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error generating audio")
+    
+    def stream_audio(self, text: str, sink, voice_id: str = None, model: str = None) -> int:
+        """
+        Generate audio from text using ElevenLabs, writing chunks to sink as they arrive.
+        
+        Args:
+            text: Text to convert to speech
+            sink: Writable binary file-like object (file, BytesIO, HTTP response stream)
+            voice_id: ElevenLabs voice ID (uses constant or default if None)
+            model: Model to use (uses constant or default if None)
+        
+        Returns:
+            Number of bytes written (MP3 format), or 0 on failure
+        """
+        written = 0
+        try:
+            for chunk in self.iter_audio(text, voice_id, model):
+                sink.write(chunk)
+                written += len(chunk)
+        except Exception as e:
+            logger.exception("Error writing audio")
+            return 0
+        return written
+    
+    def generate_audio(self, text: str, voice_id: str = None, model: str = None) -> bytes:
+        """
+        Generate audio from text using ElevenLabs.
+        
+        Args:
+            text: Text to convert to speech
+            voice_id: ElevenLabs voice ID (uses constant or default if None)
+            model: Model to use (uses constant or default if None)
+        
+        Returns:
+            Audio bytes (MP3 format)
+        """
+        if not self.client_available:
+            return None
+        
+        buffer = io.BytesIO()
+        if not self.stream_audio(text, buffer, voice_id, model):
             return None
+        return buffer.getvalue()
+    
+    async def agenerate_audio(self, text: str, voice_id: str = None, model: str = None) -> bytes:
+        """Async version of generate_audio (runs the blocking SDK call in a worker thread)."""
+        return await asyncio.to_thread(self.generate_audio, text, voice_id, model)
+    
+    async def agenerate_audio_batch(self, texts: List[str], voice_id: str = None, model: str = None) -> List[bytes]:
+        """
+        Generate audio for many texts concurrently, at most BATCH_CONCURRENCY in flight.
+        
+        Args:
+            texts: Texts to convert to speech
+            voice_id: ElevenLabs voice ID (uses constant or default if None)
+            model: Model to use (uses constant or default if None)
+        
+        Returns:
+            Audio bytes (or None on failure) for each text, in order
+        """
+        semaphore = asyncio.Semaphore(constants.BATCH_CONCURRENCY)
+        
+        async def generate(text):
+            async with semaphore:
+                return await self.agenerate_audio(text, voice_id, model)
+        
+        return await asyncio.gather(*(generate(text) for text in texts))
+    
+    def save_audio_streaming(self, text: str, filepath: str, voice_id: str = None, model: str = None) -> bool:
+        """
+        Generate audio and stream it straight to a file, without holding the clip in memory.
+        
+        Args:
+            text: Text to convert to speech
+            filepath: Path to save file
+            voice_id: ElevenLabs voice ID (uses constant or default if None)
+            model: Model to use (uses constant or default if None)
+        
+        Returns:
+            True if audio was written, False otherwise
+        """
+        try:
+            with open(filepath, 'wb', buffering=constants.TTS_WRITE_BUFFER_BYTES) as f:
+                return self.stream_audio(text, f, voice_id, model) > 0
+        except Exception as e:
+            logger.warning("Error saving audio: %s", e)
+            return False
     
     def save_audio(self, audio_bytes: bytes, filepath: str) -> bool:
         """
@@ -112,6 +310,6 @@ class TTSAgent:
                 f.write(audio_bytes)
             return True
         except Exception as e:
-            print(f"Error saving audio: {e}")
+            logger.warning("Error saving audio: %s", e)
             return False
 
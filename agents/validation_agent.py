@@ -1,8 +1,11 @@
 """Agent for validating calendar modifications."""
+import asyncio
 import os
 import sys
-from groq import Groq
-from dotenv import load_dotenv
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+import orjson
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,42 +13,70 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 import constants
-
-load_dotenv()
+from agents.groq_client import get_client, get_async_client
+from agents.llm_output import strip_fence
+from agents.time_format import format_datetime
 
 
 class ValidationAgent:
     """Validates that calendar modifications match user intent."""
     
     def __init__(self):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found")
-        self.client = Groq(api_key=api_key)
+        self.client = get_client()
+        self.aclient = get_async_client()
+        # LRU of (query, action, event fields) -> validation result
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
     
-    def validate(self, user_query: str, action_type: str, event_data: dict) -> dict:
+    def _lookup(self, key: tuple):
+        """Return a cached validation result, or None."""
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return dict(self._cache[key])
+        return None
+    
+    def _remember(self, key: tuple, result: dict):
+        """Store a validation result, evicting the oldest entry if full."""
+        with self._cache_lock:
+            self._cache[key] = dict(result)
+            self._cache.move_to_end(key)
+            if len(self._cache) > constants.VALIDATION_CACHE_MAXSIZE:
+                self._cache.popitem(last=False)
+    
+    def _prepare(self, user_query: str, action_type: str, event_data: dict) -> tuple:
         """
-        Validate that the modification matches user intent.
-        
-        Args:
-            user_query: Original user query
-            action_type: 'create', 'modify', or 'cancel'
-            event_data: Event data from database after modification
+        Short-circuit from the cache or trivial cases, or build the LLM request.
         
         Returns:
-            Dictionary with 'valid' (bool) and 'message' (str)
+            (result, request, cache_key); result is None when the LLM must be called
         """
+        # A cancelled event is expected to be gone; nothing for the LLM to judge
+        if action_type == 'cancel' and not event_data:
+            return {'valid': True, 'message': 'Event was cancelled'}, None, None
+        
+        cache_key = (
+            " ".join(user_query.lower().split()),
+            action_type,
+            str(event_data.get('summary', '')) if event_data else '',
+            str(event_data.get('start', '')) if event_data else '',
+            str(event_data.get('end', '')) if event_data else '',
+        )
+        cached = self._lookup(cache_key)
+        if cached is not None:
+            return cached, None, None
+        
         # Format event data for comparison
         event_info = ""
         if event_data:
             start = event_data.get('start', '')
             end = event_data.get('end', '')
             if start:
-                start_str = start.strftime('%Y-%m-%d %I:%M %p') if hasattr(start, 'strftime') else str(start)
+                start_str = format_datetime(start) if hasattr(start, 'strftime') else str(start)
             else:
                 start_str = 'N/A'
             if end:
-                end_str = end.strftime('%Y-%m-%d %I:%M %p') if hasattr(end, 'strftime') else str(end)
+                end_str = format_datetime(end) if hasattr(end, 'strftime') else str(end)
             else:
                 end_str = 'N/A'
             
@@ -62,31 +93,77 @@ Check if the action result matches what the user requested. Return JSON:
 
 If the result doesn't match the user's request, set valid to false."""
 
+        request = dict(
+            model=constants.LLM_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a validation agent. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=constants.VALIDATION_AGENT_TEMPERATURE,
+            max_tokens=constants.VALIDATION_AGENT_MAX_TOKENS
+        )
+        return None, request, cache_key
+    
+    def _parse(self, content: str, cache_key: tuple) -> dict:
+        """Parse the JSON verdict and cache it."""
+        content = strip_fence(content)
+        
+        result = orjson.loads(content)
+        self._remember(cache_key, result)
+        return result
+    
+    def validate(self, user_query: str, action_type: str, event_data: dict) -> dict:
+        """
+        Validate that the modification matches user intent.
+        
+        Args:
+            user_query: Original user query
+            action_type: 'create', 'modify', or 'cancel'
+            event_data: Event data from database after modification
+        
+        Returns:
+            Dictionary with 'valid' (bool) and 'message' (str)
+        """
+        result, request, cache_key = self._prepare(user_query, action_type, event_data)
+        if result is not None:
+            return result
+        
         try:
-            response = self.client.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a validation agent. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=constants.VALIDATION_AGENT_TEMPERATURE,
-                max_tokens=constants.VALIDATION_AGENT_MAX_TOKENS
-            )
+            response = self.client.chat.completions.create(**request)
+            return self._parse(response.choices[0].message.content, cache_key)
             
-            content = response.choices[0].message.content.strip()
-            if content.startswith('```'):
-                parts = content.split('```')
-                if len(parts) > 1:
-                    content = parts[1]
-                    if content.startswith('json'):
-                        content = content[4:]
-                content = content.strip()
-            
-            import json
-            result = json.loads(content)
+        except Exception as e:
+            # On error, assume valid (don't block on validation errors)
+            return {'valid': True, 'message': f'Validation error: {str(e)}'}
+    
+    async def avalidate(self, user_query: str, action_type: str, event_data: dict) -> dict:
+        """Async version of validate."""
+        result, request, cache_key = self._prepare(user_query, action_type, event_data)
+        if result is not None:
             return result
+        
+        try:
+            response = await self.aclient.chat.completions.create(**request)
+            return self._parse(response.choices[0].message.content, cache_key)
             
         except Exception as e:
             # On error, assume valid (don't block on validation errors)
             return {'valid': True, 'message': f'Validation error: {str(e)}'}
-
+    
+    async def avalidate_batch(self, items: List[Tuple[str, str, dict]]) -> List[dict]:
+        """
+        Validate many actions concurrently, at most BATCH_CONCURRENCY in flight.
+        
+        Args:
+            items: (user_query, action_type, event_data) tuples
+        
+        Returns:
+            Validation results, in the same order as items
+        """
+        semaphore = asyncio.Semaphore(constants.BATCH_CONCURRENCY)
+        
+        async def check(item):
+            async with semaphore:
+                return await self.avalidate(*item)
+        
+        return await asyncio.gather(*(check(item) for item in items))
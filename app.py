@@ -1,16 +1,78 @@
 """Flask web application for calendar scheduling."""
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, copy_current_request_context
+from flask.json.provider import DefaultJSONProvider, JSONProvider
 from flask_cors import CORS
-from auth_manager import AuthManager, get_user_calendar_service
+from auth_manager import get_auth_manager, get_user_calendar_service, credentials_to_session
 import threading
-import queue
+from collections import OrderedDict
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from dataclasses import dataclass, field
+from typing import Optional
+import atexit
 import json
+import logging
+import queue
+import sqlite3
+import orjson
 import os
-import tempfile
 import secrets
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import unquote
+from googleapiclient.errors import HttpError
 import constants
+from timezone_manager import TimezoneManager
+from agents.time_format import parse_local_datetime
+from agents.intent_agent import IntentAgent
+from agents.action_parser_agent import ActionParserAgent
+from agents.validation_agent import ValidationAgent
+from agents.calendar_agent import CalendarAgent
+from agents.calendar_management_agent import CalendarManagementAgent
+from agents.qa_agent import QAAgent
+from agents.sql_agent import SQLAgent
+from agents.database_agent import DatabaseAgent
+from agents.response_agent import ResponseAgent
+from agents.tts_agent import TTSAgent
+
+# Agents log diagnostics at DEBUG; keep them quiet unless LOG_LEVEL asks for them.
+# Records are handed to a listener thread, so request threads never block writing to stderr.
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), handlers=[QueueHandler(log_queue)])
+log_listener = QueueListener(log_queue, log_stream_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger = logging.getLogger(__name__)
+
+
+
+class OrjsonJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, which serializes datetimes natively."""
+
+    def _dumpb(self, obj) -> bytes:
+        """Encode obj; types orjson doesn't know fall back to Flask's default handling."""
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(self, obj, **kwargs):
+        """Encode obj as a str."""
+        return self._dumpb(obj).decode()
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response (used by jsonify) from orjson's bytes, without a str round trip."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumpb(obj), mimetype='application/json')
+
+    def loads(self, s, **kwargs):
+        """Decode a JSON document."""
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonJSONProvider(app)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(16))
 # Configure session to persist
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -18,136 +80,337 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
 CORS(app, supports_credentials=True)
 
-# Auth manager for OAuth flow (lazy initialization)
-auth_manager = None
 
-def get_auth_manager():
-    """Get or create auth manager instance."""
-    global auth_manager
-    if auth_manager is None:
-        auth_manager = AuthManager()
-    return auth_manager
+@dataclass(slots=True)
+class Orchestrator:
+    """One session's agents, built without the interactive prompts of the CLI orchestrator."""
+    timezone_manager: TimezoneManager
+    intent_agent: IntentAgent
+    action_parser_agent: ActionParserAgent
+    validation_agent: ValidationAgent
+    calendar_agent: CalendarAgent
+    calendar_management_agent: CalendarManagementAgent
+    qa_agent: QAAgent
+    sql_agent: SQLAgent
+    database_agent: DatabaseAgent
+    response_agent: ResponseAgent
+    tts_agent: Optional[TTSAgent]
+    # Set once the initial database sync has finished
+    db_ready: threading.Event = field(default_factory=threading.Event)
+    # Requests and background syncs using the agents' database connections; an evicted
+    # orchestrator is only closed once this drops to zero (see release_orchestrator)
+    users: int = 0
+    closing: bool = False
+    use_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class OrchestratorCache:
+    """
+    Per-session orchestrators, bounded in size and idle time.
+    
+    Entries are kept in least-recently-used order; an entry idle for longer
+    than ttl, or the oldest one when the cache is full, is removed and passed
+    to on_evict so its database connections can be closed.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float, on_evict):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries = OrderedDict()  # session_id -> (orchestrator, last used)
+        self._lock = threading.RLock()
+    
+    def _expire(self, now: float) -> list:
+        """Pop idle entries (they sit at the front in LRU order); caller holds the lock."""
+        expired = []
+        while self._entries:
+            session_id, (orch, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.ttl:
+                break
+            del self._entries[session_id]
+            expired.append((session_id, orch))
+        return expired
+    
+    def _evict(self, evicted: list):
+        """Run on_evict outside the lock."""
+        for session_id, orch in evicted:
+            self.on_evict(session_id, orch)
+    
+    def get(self, session_id):
+        """Return the session's orchestrator (refreshing its idle timer), or None."""
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries[session_id] = (entry[0], now)
+                self._entries.move_to_end(session_id)
+        self._evict(evicted)
+        return entry[0] if entry is not None else None
+    
+    def put(self, session_id, orch):
+        """Store an orchestrator, evicting the least recently used one if full."""
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._expire(now)
+            self._entries[session_id] = (orch, now)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.maxsize:
+                oldest_id, (oldest, _) = self._entries.popitem(last=False)
+                evicted.append((oldest_id, oldest))
+        self._evict(evicted)
+    
+    def pop(self, session_id):
+        """Remove and return the session's orchestrator without calling on_evict, or None."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        return entry[0] if entry is not None else None
+
+# Work that should not delay the HTTP response, e.g. reconciling the database after a mutation
+background_executor = ThreadPoolExecutor(max_workers=constants.BACKGROUND_WORKERS)
+# Calls a request waits on itself, kept apart so they never queue behind background work
+prefetch_executor = ThreadPoolExecutor(max_workers=constants.PREFETCH_WORKERS)
+# One lock per session so two reconciles never rewrite the same user's database at once
+session_locks = {}
+# One lock per session so a login pre-warm and the first request never both build its orchestrator
+init_locks = {}
+session_locks_guard = threading.Lock()
+
+
+def get_session_lock(session_id):
+    """Get or create the reconcile lock for a session."""
+    with session_locks_guard:
+        return session_locks.setdefault(session_id, threading.Lock())
+
+
+def get_init_lock(session_id):
+    """Get or create the orchestrator-building lock for a session."""
+    with session_locks_guard:
+        return init_locks.setdefault(session_id, threading.Lock())
+
+
+def get_session_id():
+    """Return the session's ID, creating one if needed."""
+    session_id = session.get('session_id')
+    if not session_id:
+        session_id = secrets.token_hex(16)
+        session['session_id'] = session_id
+    return session_id
+
+
+def reconcile_db(orch, session_id):
+    """Incrementally sync the user's database with Google Calendar (runs in background_executor, holding orch)."""
+    try:
+        with get_session_lock(session_id):
+            result = orch.calendar_agent.get_all_events(store_in_db=True)
+            if not result.get('success'):
+                logger.warning("Background reconcile failed: %s", result.get('message'))
+    except Exception as e:
+        logger.exception("Background reconcile error")
+    finally:
+        release_orchestrator(orch)
+
+
+def seed_db(orch, user_db_path):
+    """Fill a new session's database from Google Calendar (runs in background_executor, holding orch)."""
+    try:
+        orch.calendar_agent.resync_events()
+        logger.debug("Events fetched and stored in %s", user_db_path)
+    except Exception as e:
+        logger.exception("Initial database sync error")
+    finally:
+        orch.db_ready.set()
+        release_orchestrator(orch)
+
+
+# (user key, calendar ID) -> (timezone name, fetched at); 'primary' differs per user, so the key includes the user
+calendar_tz_cache = {}
+
+
+def get_user_key():
+    """Stable, non-secret key for the logged-in Google user (unlike session_id, it survives re-login)."""
+    credentials = session.get('credentials', {})
+    return hashlib.sha256((credentials.get('refresh_token') or credentials.get('token') or '').encode()).hexdigest()
+
+
+def get_calendar_timezone(calendar_service):
+    """Return the calendar's timezone, calling calendars().get only when the cached value is missing or stale."""
+    cache_key = (get_user_key(), constants.CALENDAR_ID)
+    
+    cached = calendar_tz_cache.get(cache_key)
+    if cached and time.time() - cached[1] < constants.CALENDAR_TZ_CACHE_TTL_SEC:
+        return cached[0]
+    
+    calendar_info = calendar_service.calendars().get(calendarId=constants.CALENDAR_ID).execute()
+    calendar_tz = calendar_info.get('timeZone', 'UTC')
+    calendar_tz_cache[cache_key] = (calendar_tz, time.time())
+    return calendar_tz
+
+
+def close_orchestrator(orch):
+    """Close the per-session database connections held by an orchestrator's agents."""
+    for agent in (orch.calendar_agent, orch.database_agent, orch.sql_agent):
+        try:
+            agent.close()
+        except Exception as e:
+            logger.warning("Error closing %s: %s", type(agent).__name__, e)
 
-# Per-user orchestrators (stored in session)
-orchestrators = {}
+
+def hold_orchestrator(orch):
+    """Register a user of orch's connections; False if it has already been closed."""
+    with orch.use_lock:
+        if orch.closing and orch.users == 0:
+            return False
+        orch.users += 1
+        return True
+
+
+def release_orchestrator(orch):
+    """Drop a user registered by hold_orchestrator, closing orch if it was evicted meanwhile."""
+    if orch is None:
+        return
+    with orch.use_lock:
+        orch.users -= 1
+        close_now = orch.closing and orch.users == 0
+    if close_now:
+        close_orchestrator(orch)
+
+
+def evict_orchestrator(session_id, orch):
+    """Close a session's orchestrator once the requests and background syncs using it finish, and forget its locks."""
+    with orch.use_lock:
+        orch.closing = True
+        close_now = orch.users == 0
+    if close_now:
+        close_orchestrator(orch)
+    with session_locks_guard:
+        session_locks.pop(session_id, None)
+        init_locks.pop(session_id, None)
+
+
+# Per-user orchestrators, keyed by the session ID stored in the session cookie
+orchestrators = OrchestratorCache(
+    constants.ORCHESTRATOR_CACHE_MAXSIZE, constants.ORCHESTRATOR_IDLE_TTL_SEC, evict_orchestrator
+)
+
+
+def format_events(events):
+    """Shape event dicts (or Event rows) for the frontend; the JSON provider renders datetimes as ISO 8601."""
+    return [
+        {
+            'id': event.get('id'),
+            'summary': event.get('summary', 'No title'),
+            'start': event.get('start'),
+            'end': event.get('end'),
+            'location': event.get('location', ''),
+            'description': event.get('description', '')
+        }
+        for event in events
+    ]
+
+
+def get_cached_orchestrator():
+    """Return the current session's orchestrator if it already exists, without rebuilding the calendar service."""
+    if 'credentials' not in session:
+        return None
+    return orchestrators.get(session.get('session_id'))
 
 def init_orchestrator():
     """Initialize orchestrator for current user session (lazy initialization)."""
+    orchestrator = get_cached_orchestrator()
+    if orchestrator is not None:
+        return orchestrator
+    
     try:
-        print(f"DEBUG: init_orchestrator() called")
+        logger.debug("init_orchestrator() called")
         # Get user's calendar service
         calendar_service = get_user_calendar_service()
         if not calendar_service:
-            print(f"ERROR: Cannot initialize orchestrator - calendar service is None")
-            print(f"Session has credentials: {'credentials' in session}")
-            if 'credentials' in session:
-                print(f"Credentials keys: {list(session['credentials'].keys())}")
+            logger.error("Cannot initialize orchestrator - calendar service is None (session has credentials: %s)",
+                         'credentials' in session)
             return None
         
-        print(f"DEBUG: Calendar service obtained, proceeding with orchestrator initialization...")
+        logger.debug("Calendar service obtained, proceeding with orchestrator initialization")
         
         # Use session ID as key for per-user orchestrators
-        session_id = session.get('session_id')
-        if not session_id:
-            session_id = secrets.token_hex(16)
-            session['session_id'] = session_id
-        
-        # Check if orchestrator already exists for this user
-        if session_id in orchestrators:
-            print(f"DEBUG: Using existing orchestrator for session {session_id}")
-            return orchestrators[session_id]
-        
-        # Create new orchestrator for this user
-        # For web app, use a default timezone or get from calendar
-        # We'll initialize without timezone prompt for web
-        from timezone_manager import TimezoneManager
-        import pytz
-        
-        # Get calendar timezone
-        try:
-            print(f"DEBUG: Getting calendar timezone...")
-            calendar_info = calendar_service.calendars().get(calendarId=constants.CALENDAR_ID).execute()
-            calendar_tz = calendar_info.get('timeZone', 'UTC')
-            print(f"DEBUG: Calendar timezone: {calendar_tz}")
-            tz_manager = TimezoneManager(calendar_tz)
-        except Exception as e:
-            print(f"WARNING: Failed to get calendar timezone: {e}, using UTC")
-            import traceback
-            traceback.print_exc()
-            tz_manager = TimezoneManager('UTC')
-        
-        # Create orchestrator components manually to avoid interactive prompts
-        # Note: TranscriptionAgent was removed - not needed for web app
-        from agents.intent_agent import IntentAgent
-        from agents.action_parser_agent import ActionParserAgent
-        from agents.validation_agent import ValidationAgent
-        from agents.calendar_agent import CalendarAgent
-        from agents.calendar_management_agent import CalendarManagementAgent
-        from agents.qa_agent import QAAgent
-        from agents.sql_agent import SQLAgent
-        from agents.database_agent import DatabaseAgent
-        from agents.response_agent import ResponseAgent
-        from agents.tts_agent import TTSAgent
-        
-        qa_agent = QAAgent()
-        try:
-            tts_agent = TTSAgent() if os.getenv('ELEVENLABS_API_KEY') else None
-        except Exception as e:
-            print(f"Warning: TTS agent initialization failed: {e}")
-            tts_agent = None
-        # Per-user database path
-        user_db_path = f"{constants.DB_PATH}.{session_id}"
-        
-        orchestrator = type('Orchestrator', (), {
-            'timezone_manager': tz_manager,
-            'intent_agent': IntentAgent(),
-            'action_parser_agent': ActionParserAgent(),
-            'validation_agent': ValidationAgent(),
-            'calendar_agent': CalendarAgent(calendar_service, user_db_path, tz_manager),
-            'calendar_management_agent': CalendarManagementAgent(calendar_service, tz_manager),
-            'qa_agent': qa_agent,
-            'sql_agent': SQLAgent(user_db_path, qa_agent, tz_manager),
-            'database_agent': DatabaseAgent(user_db_path, tz_manager),
-            'response_agent': ResponseAgent(),
-            'tts_agent': tts_agent,
-        })()
-        
-        # Initialize database
-        print(f"DEBUG: Initializing database at {user_db_path}...")
-        from database import CalendarDatabase
-        db = CalendarDatabase(user_db_path)
-        db.clear_all_events()
-        print(f"DEBUG: Fetching events and storing in DB...")
-        orchestrator.calendar_agent.get_all_events(store_in_db=True)
-        print(f"DEBUG: Events fetched and stored")
-        
-        # Store orchestrator for this user
-        orchestrators[session_id] = orchestrator
-        print(f"DEBUG: Orchestrator stored for session {session_id}")
+        session_id = get_session_id()
+        
+        with get_init_lock(session_id):
+            # Check if orchestrator already exists for this user
+            existing = orchestrators.get(session_id)
+            if existing is not None:
+                logger.debug("Using existing orchestrator for session %s", session_id)
+                return existing
+        
+            # Create new orchestrator for this user
+            # For web app, use a default timezone or get from calendar
+            # We'll initialize without timezone prompt for web
+        
+            # Get calendar timezone
+            try:
+                calendar_tz = get_calendar_timezone(calendar_service)
+                logger.debug("Calendar timezone: %s", calendar_tz)
+                tz_manager = TimezoneManager(calendar_tz)
+            except Exception as e:
+                logger.warning("Failed to get calendar timezone, using UTC", exc_info=True)
+                tz_manager = TimezoneManager('UTC')
+        
+            # Create orchestrator components manually to avoid interactive prompts
+            # Note: TranscriptionAgent was removed - not needed for web app
+            qa_agent = QAAgent()
+            try:
+                tts_agent = TTSAgent() if os.getenv('ELEVENLABS_API_KEY') else None
+            except Exception as e:
+                logger.warning("TTS agent initialization failed: %s", e)
+                tts_agent = None
+            # Per-user database path
+            user_db_path = f"{constants.DB_PATH}.{session_id}"
+            # Keeps this user's entries apart in the shared LLM cache file
+            cache_scope = f"{get_user_key()}:{constants.CALENDAR_ID}"
+        
+            orchestrator = Orchestrator(
+                timezone_manager=tz_manager,
+                intent_agent=IntentAgent(),
+                action_parser_agent=ActionParserAgent(cache_scope),
+                validation_agent=ValidationAgent(),
+                calendar_agent=CalendarAgent(calendar_service, user_db_path, tz_manager),
+                calendar_management_agent=CalendarManagementAgent(calendar_service, tz_manager),
+                qa_agent=qa_agent,
+                sql_agent=SQLAgent(user_db_path, qa_agent, tz_manager),
+                database_agent=DatabaseAgent(user_db_path, tz_manager),
+                response_agent=ResponseAgent(),
+                tts_agent=tts_agent
+            )
+        
+            # Initialize database in the background so the first request isn't held up by the full sync
+            logger.debug("Initializing database at %s in the background", user_db_path)
+            hold_orchestrator(orchestrator)
+            background_executor.submit(seed_db, orchestrator, user_db_path)
+        
+            # Store orchestrator for this user
+            orchestrators.put(session_id, orchestrator)
+            logger.debug("Orchestrator stored for session %s", session_id)
     
-        result = orchestrators.get(session_id)
-        print(f"DEBUG: Returning orchestrator: {'Found' if result else 'None'}")
-        return result
+            return orchestrators.get(session_id)
     except Exception as e:
-        print(f"ERROR in init_orchestrator(): {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in init_orchestrator()")
         return None
 
-# Queue for voice input/output
-voice_queue = queue.Queue()
-response_queue = queue.Queue()
+
+def hold_session_orchestrator():
+    """Return the current session's orchestrator held for this request (release_orchestrator when done), or None."""
+    while True:
+        orch = init_orchestrator()
+        if orch is None or hold_orchestrator(orch):
+            return orch
+        # Evicted and closed between lookup and hold; init_orchestrator builds a fresh one
 
 
 @app.before_request
 def log_request_info():
     """Log all incoming requests for debugging."""
     if request.path.startswith('/auth/callback') or request.path.startswith('/login'):
-        print(f"\n{'='*60}")
-        print(f"REQUEST: {request.method} {request.path}")
-        print(f"URL: {request.url}")
-        print(f"Args: {dict(request.args)}")
-        print(f"{'='*60}\n")
+        logger.debug("REQUEST: %s %s (args: %s)", request.method, request.url, request.args.to_dict())
 
 @app.route('/')
 def index():
@@ -165,12 +428,10 @@ def login():
         auth_mgr = get_auth_manager()
         authorization_url, state = auth_mgr.get_authorization_url()
         session['oauth_state'] = state
-        print(f"Redirecting to: {authorization_url}")
+        logger.debug("Redirecting to: %s", authorization_url)
         return redirect(authorization_url)
     except Exception as e:
-        print(f"Error in login: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in login")
         return jsonify({'error': f'Login failed: {str(e)}'}), 500
 
 
@@ -178,12 +439,6 @@ def login():
 def oauth_callback():
     """Handle OAuth callback."""
     try:
-        print(f"\n=== OAuth Callback Received ===")
-        print(f"Request URL: {request.url}")
-        print(f"Request args: {dict(request.args)}")
-        print(f"Request method: {request.method}")
-        print(f"===============================\n")
-        
         # Check for error from Google
         error = request.args.get('error')
         if error:
@@ -191,155 +446,63 @@ def oauth_callback():
             error_uri = request.args.get('error_uri', '')
             
             # Log all error details for debugging
-            print(f"=== OAuth Error Details ===")
-            print(f"Error: {error}")
-            print(f"Description: {error_description}")
-            print(f"Error URI: {error_uri}")
-            print(f"All request args: {dict(request.args)}")
-            print(f"===========================")
+            logger.error("OAuth error: %s (description: %s, URI: %s, args: %s)",
+                         error, error_description, error_uri, request.args.to_dict())
             
             # Decode URL-encoded error description
-            from urllib.parse import unquote
             error_description_decoded = unquote(error_description.replace('+', ' '))
             
-            # Provide specific guidance based on error type
-            guidance = ""
+            # Pick guidance based on error type
+            guidance_kind = None
             if 'access_denied' in error or 'consent' in error_description.lower():
-                guidance = f"""
-                <h3>Access Denied Error</h3>
-                <p><strong>Important:</strong> Even if you added the user as a test user, the app must be in "Testing" mode (not "Published") for test users to work.</p>
-                
-                <h4>Step-by-Step Fix:</h4>
-                <ol>
-                    <li><strong>Go to OAuth Consent Screen:</strong> <a href="https://console.cloud.google.com/apis/credentials/consent" target="_blank">Click here</a></li>
-                    <li><strong>Check Publishing Status:</strong> Look at the top of the page - does it say "In production" or "Testing"?</li>
-                    <li><strong>If it says "In production":</strong>
-                        <ul>
-                            <li>Click the "<strong>BACK TO TESTING</strong>" button (usually at the top right)</li>
-                            <li>Confirm the change</li>
-                        </ul>
-                    </li>
-                    <li><strong>Add Test Users:</strong>
-                        <ul>
-                            <li>Scroll to "Test users" section</li>
-                            <li>Click "+ ADD USERS"</li>
-                            <li>Add the email address of the user trying to log in</li>
-                            <li>Click "ADD"</li>
-                        </ul>
-                    </li>
-                    <li><strong>Save all changes</strong></li>
-                    <li><strong>Wait 5-10 minutes</strong> for changes to propagate</li>
-                    <li><strong>Clear browser cache/cookies</strong> or use incognito mode</li>
-                    <li><strong>Try logging in again</strong></li>
-                </ol>
-                
-                <h4>Common Issues:</h4>
-                <ul>
-                    <li>❌ App is "Published" instead of "Testing" - test users only work in Testing mode</li>
-                    <li>❌ Email not added exactly as it appears in Google account</li>
-                    <li>❌ Changes not saved or not propagated yet (wait a few minutes)</li>
-                    <li>❌ Browser cache showing old OAuth state</li>
-                </ul>
-                
-                <h4>If Still Not Working:</h4>
-                <p>Check the server logs above for the exact error message. The error description will tell you exactly what Google is rejecting.</p>
-                """
+                guidance_kind = 'access_denied'
             elif 'redirect_uri_mismatch' in error_description.lower():
-                guidance = """
-                <h3>Redirect URI Mismatch:</h3>
-                <p>The redirect URI in your app doesn't match Google Cloud Console settings.</p>
-                <p><strong>Fix:</strong></p>
-                <ol>
-                    <li>Go to <a href="https://console.cloud.google.com/apis/credentials" target="_blank">Credentials</a></li>
-                    <li>Click on your OAuth 2.0 Client ID</li>
-                    <li>Under "Authorized redirect URIs", ensure <code>http://localhost:5000/auth/callback</code> is listed</li>
-                    <li>Save changes</li>
-                </ol>
-                """
+                guidance_kind = 'redirect_uri_mismatch'
             
-            return f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Authentication Error</title>
-                <style>
-                    body {{ font-family: Arial, sans-serif; max-width: 900px; margin: 50px auto; padding: 20px; line-height: 1.6; }}
-                    h2 {{ color: #d32f2f; }}
-                    h3 {{ color: #1976d2; margin-top: 30px; }}
-                    h4 {{ color: #555; margin-top: 20px; }}
-                    code {{ background: #f5f5f5; padding: 2px 6px; border-radius: 3px; font-family: monospace; }}
-                    a {{ color: #1976d2; text-decoration: none; }}
-                    a:hover {{ text-decoration: underline; }}
-                    ol, ul {{ margin: 10px 0; padding-left: 30px; }}
-                    li {{ margin: 8px 0; }}
-                    .error-box {{ background: #ffebee; border-left: 4px solid #d32f2f; padding: 15px; margin: 20px 0; }}
-                </style>
-            </head>
-            <body>
-                <h2>🔒 Authentication Error</h2>
-                <div class="error-box">
-                    <p><strong>Error Code:</strong> <code>{error}</code></p>
-                    <p><strong>Description:</strong> {error_description_decoded}</p>
-                    {f'<p><strong>Error URI:</strong> <a href="{error_uri}" target="_blank">{error_uri}</a></p>' if error_uri else ''}
-                </div>
-                {guidance if guidance else '<p>Please check the server logs for more details.</p>'}
-                <p style="margin-top: 30px;"><a href="/login">← Try again</a></p>
-            </body>
-            </html>
-            """, 403
+            return render_template(
+                'oauth_error.html',
+                error=error,
+                description=error_description_decoded,
+                error_uri=error_uri,
+                guidance_kind=guidance_kind
+            ), 403
         
         # Verify state
         state = session.get('oauth_state')
         received_state = request.args.get('state')
-        print(f"State verification - Session: {state}, Received: {received_state}")
         if not state or received_state != state:
-            print(f"ERROR: Invalid state parameter")
+            logger.error("Invalid state parameter")
             return jsonify({'error': 'Invalid state parameter'}), 400
         
         # Get authorization code
         code = request.args.get('code')
-        print(f"Authorization code received: {code[:20] + '...' if code else 'None'}")
         if not code:
-            print(f"ERROR: No authorization code provided")
+            logger.error("No authorization code provided")
             return jsonify({'error': 'No authorization code provided'}), 400
         
-        print(f"Attempting to exchange code for credentials...")
-        
         # Exchange code for credentials
-        print(f"Exchanging authorization code for credentials...")
         try:
             auth_mgr = get_auth_manager()
             credentials = auth_mgr.get_credentials_from_code(code)
-            print(f"✓ Credentials obtained successfully")
         except Exception as e:
-            print(f"✗ ERROR exchanging code for credentials: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error exchanging code for credentials")
             return jsonify({'error': f'Failed to get credentials: {str(e)}'}), 500
         
         # Store credentials in session
-        print(f"Storing credentials in session...")
         session.permanent = True  # Make session persistent
-        session['credentials'] = {
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        }
-        print(f"✓ Credentials stored. Session ID: {session.get('session_id', 'NOT SET')}")
-        print(f"Credentials keys: {list(session['credentials'].keys())}")
-        print(f"Session permanent: {session.permanent}")
+        session['credentials'] = credentials_to_session(credentials)
+        logger.debug("Credentials stored for session %s", session.get('session_id', 'NOT SET'))
         
         # Clear OAuth state
         session.pop('oauth_state', None)
         
+        # Build the orchestrator (and start its database sync) while the browser follows the redirect
+        get_session_id()
+        background_executor.submit(copy_current_request_context(init_orchestrator))
+        
         return redirect(url_for('index'))
     except Exception as e:
-        print(f"OAuth callback error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("OAuth callback error")
         return f"""
         <html>
             <body>
@@ -355,8 +518,10 @@ def oauth_callback():
 def logout():
     """Logout user and clear session."""
     session_id = session.get('session_id')
-    if session_id and session_id in orchestrators:
-        del orchestrators[session_id]
+    if session_id:
+        orch = orchestrators.pop(session_id)
+        if orch is not None:
+            evict_orchestrator(session_id, orch)
     session.clear()
     return redirect(url_for('login'))
 
@@ -373,34 +538,27 @@ def auth_status():
 @app.route('/api/events', methods=['GET'])
 def get_events():
     """Get all calendar events."""
+    orch = None
     try:
-        orch = init_orchestrator()
+        orch = hold_session_orchestrator()
         if not orch:
             return jsonify({'success': False, 'error': 'Not authenticated. Please log in.'}), 401
         
         result = orch.calendar_agent.get_all_events(store_in_db=False)
         events = result.get('events', []) if result and result.get('success') else []
         
-        # Format events for frontend
-        formatted_events = []
-        for event in events:
-            formatted_events.append({
-                'id': event.get('id'),
-                'summary': event.get('summary', 'No title'),
-                'start': event.get('start').isoformat() if event.get('start') else None,
-                'end': event.get('end').isoformat() if event.get('end') else None,
-                'location': event.get('location', ''),
-                'description': event.get('description', '')
-            })
-        
-        return jsonify({'success': True, 'events': formatted_events})
+        return jsonify({'success': True, 'events': format_events(events)})
     except Exception as e:
+        logger.exception("/api/events error")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        release_orchestrator(orch)
 
 
 @app.route('/api/query', methods=['POST'])
 def handle_query():
     """Handle user query (voice or text)."""
+    orch = None
     try:
         data = request.json
         user_input = data.get('query', '').strip()
@@ -408,29 +566,33 @@ def handle_query():
         if not user_input:
             return jsonify({'success': False, 'error': 'Empty query'}), 400
         
-        # Initialize orchestrator if needed
-        print(f"DEBUG: /api/query - Initializing orchestrator...")
-        orch = init_orchestrator()
+        # Initialize orchestrator if needed; held so a concurrent logout can't close its connections mid-query
+        orch = hold_session_orchestrator()
         if not orch:
-            print(f"ERROR: /api/query - Orchestrator is None, returning 401")
+            logger.error("/api/query - Orchestrator is None, returning 401")
             return jsonify({'success': False, 'error': 'Not authenticated. Please log in.'}), 401
-        print(f"DEBUG: /api/query - Orchestrator initialized successfully")
         
         # Process query through orchestrator
-        # This is a simplified version - in production, you'd want async handling
+        # Fetch events while the intent is classified; query, modify and cancel all need them
+        events_future = prefetch_executor.submit(orch.calendar_agent.get_all_events, store_in_db=False)
         intent = orch.intent_agent.identify_intent(user_input)
+        if intent not in ['query', 'modify', 'cancel']:
+            events_future.cancel()
         
         response_text = ""
         events = []
+        mutated = False
         
         if intent == 'query':
-            result = orch.calendar_agent.get_all_events(store_in_db=False)
+            result = events_future.result()
             events_data = result.get('events', []) if result and result.get('success') else []
             
             sql_query = orch.sql_agent.text_to_sql(user_input, events=events_data)
             
             if sql_query:
-                events = orch.database_agent.execute_query(sql_query, print_raw=False)
+                # The SQL runs against the user's database, so let the initial sync finish first
+                orch.db_ready.wait(timeout=constants.DB_SEED_TIMEOUT_SEC)
+                events = orch.database_agent.execute_query(sql_query, print_raw=False, limit=constants.MAX_EVENTS_FOR_RESPONSE)
                 response_text = orch.response_agent.generate_response(user_input, events)
             else:
                 response_text = orch.qa_agent.answer(user_input, events_data)
@@ -440,19 +602,17 @@ def handle_query():
             if orch.timezone_manager:
                 current_date = orch.timezone_manager.now_in_user_tz().strftime('%Y-%m-%d')
             else:
-                from datetime import datetime
                 current_date = datetime.now().strftime('%Y-%m-%d')
             
             params = orch.action_parser_agent.parse_create(user_input, current_date=current_date)
             
             if 'error' not in params and 'start_time' in params and 'end_time' in params:
-                from datetime import datetime
-                start_dt = datetime.strptime(params['start_time'], '%Y-%m-%d %H:%M')
-                end_dt = datetime.strptime(params['end_time'], '%Y-%m-%d %H:%M')
+                start_dt = parse_local_datetime(params['start_time'])
+                end_dt = parse_local_datetime(params['end_time'])
                 
                 if orch.timezone_manager:
-                    start_dt = orch.timezone_manager.user_timezone.localize(start_dt)
-                    end_dt = orch.timezone_manager.user_timezone.localize(end_dt)
+                    start_dt = start_dt.replace(tzinfo=orch.timezone_manager.user_timezone)
+                    end_dt = end_dt.replace(tzinfo=orch.timezone_manager.user_timezone)
                 
                 # Check conflicts
                 conflicts = orch.calendar_management_agent.check_conflicts(start_dt, end_dt)
@@ -476,11 +636,9 @@ def handle_query():
                     )
                     
                     if result.get('success'):
-                        # Refresh database
-                        from database import CalendarDatabase
-                        db = CalendarDatabase(orch.calendar_agent.db_path)
-                        db.clear_all_events()
-                        orch.calendar_agent.get_all_events(store_in_db=True)
+                        # Apply the change locally instead of re-syncing the whole calendar
+                        orch.calendar_agent.upsert_event(result['event'])
+                        mutated = True
                         response_text = result.get('message', 'Event created.')
                     else:
                         response_text = result.get('message', 'Failed to create event.')
@@ -489,7 +647,7 @@ def handle_query():
         
         elif intent == 'modify':
             # Get events for context
-            result = orch.calendar_agent.get_all_events(store_in_db=False)
+            result = events_future.result()
             events_data = result.get('events', []) if result and result.get('success') else []
             
             # Parse modify parameters
@@ -501,26 +659,28 @@ def handle_query():
                 response_text = "Could not identify which event to modify."
             else:
                 # Parse optional datetime strings
-                from datetime import datetime
                 start_dt = None
                 end_dt = None
                 
                 if params.get('start_time'):
-                    start_dt = datetime.strptime(params['start_time'], '%Y-%m-%d %H:%M')
+                    start_dt = parse_local_datetime(params['start_time'])
                     if orch.timezone_manager:
-                        start_dt = orch.timezone_manager.user_timezone.localize(start_dt)
+                        start_dt = start_dt.replace(tzinfo=orch.timezone_manager.user_timezone)
                 
                 if params.get('end_time'):
-                    end_dt = datetime.strptime(params['end_time'], '%Y-%m-%d %H:%M')
+                    end_dt = parse_local_datetime(params['end_time'])
                     if orch.timezone_manager:
-                        end_dt = orch.timezone_manager.user_timezone.localize(end_dt)
+                        end_dt = end_dt.replace(tzinfo=orch.timezone_manager.user_timezone)
                 
                 # Check for conflicts (excluding the event being modified)
                 if start_dt:
                     # If end_dt not provided, get original event duration
-                    if not end_dt:
+                    original = next((e for e in events_data if e.get('id') == params['event_id']), None)
+                    if not end_dt and original is not None:
+                        # The prefetched events already carry it; no extra Calendar round trip
+                        end_dt = start_dt + (original['end'] - original['start'])
+                    elif not end_dt:
                         try:
-                            import constants
                             event = orch.calendar_management_agent.service.events().get(
                                 calendarId=constants.CALENDAR_ID, eventId=params['event_id']
                             ).execute()
@@ -531,14 +691,13 @@ def handle_query():
                                 original_start = datetime.fromisoformat(original_start_str.replace('Z', '+00:00'))
                                 original_end = datetime.fromisoformat(original_end_str.replace('Z', '+00:00'))
                             else:
-                                from datetime import timezone
                                 original_start = datetime.fromisoformat(original_start_str).replace(tzinfo=timezone.utc)
                                 original_end = datetime.fromisoformat(original_end_str).replace(tzinfo=timezone.utc)
                             
                             duration = original_end - original_start
                             end_dt = start_dt + duration
-                        except:
-                            pass
+                        except (HttpError, KeyError, ValueError) as e:
+                            logger.debug("Could not read original duration of %s: %s", params['event_id'], e)
                     
                     if end_dt:
                         conflicts = orch.calendar_management_agent.check_conflicts(
@@ -566,11 +725,9 @@ def handle_query():
                             )
                             
                             if result.get('success'):
-                                # Refresh database
-                                from database import CalendarDatabase
-                                db = CalendarDatabase(orch.calendar_agent.db_path)
-                                db.clear_all_events()
-                                orch.calendar_agent.get_all_events(store_in_db=True)
+                                # Apply the change locally instead of re-syncing the whole calendar
+                                orch.calendar_agent.upsert_event(result['event'])
+                                mutated = True
                                 response_text = result.get('message', 'Event modified.')
                             else:
                                 response_text = result.get('message', 'Failed to modify event.')
@@ -589,18 +746,16 @@ def handle_query():
                     )
                     
                     if result.get('success'):
-                        # Refresh database
-                        from database import CalendarDatabase
-                        db = CalendarDatabase(orch.calendar_agent.db_path)
-                        db.clear_all_events()
-                        orch.calendar_agent.get_all_events(store_in_db=True)
+                        # Apply the change locally instead of re-syncing the whole calendar
+                        orch.calendar_agent.upsert_event(result['event'])
+                        mutated = True
                         response_text = result.get('message', 'Event modified.')
                     else:
                         response_text = result.get('message', 'Failed to modify event.')
         
         elif intent == 'cancel':
             # Get events for context
-            result = orch.calendar_agent.get_all_events(store_in_db=False)
+            result = events_future.result()
             events_data = result.get('events', []) if result and result.get('success') else []
             
             # Parse cancel parameters
@@ -612,14 +767,15 @@ def handle_query():
                 response_text = "Could not identify which event to cancel."
             else:
                 # Cancel event
-                result = orch.calendar_management_agent.cancel_event(params['event_id'])
+                result = orch.calendar_management_agent.cancel_event(
+                    params['event_id'],
+                    summary=next((e.get('summary') for e in events_data if e.get('id') == params['event_id']), None)
+                )
                 
                 if result.get('success'):
-                    # Refresh database
-                    from database import CalendarDatabase
-                    db = CalendarDatabase(orch.calendar_agent.db_path)
-                    db.clear_all_events()
-                    orch.calendar_agent.get_all_events(store_in_db=True)
+                    # Apply the change locally instead of re-syncing the whole calendar
+                    orch.calendar_agent.delete_event(result['event_id'])
+                    mutated = True
                     response_text = result.get('message', 'Event cancelled.')
                 else:
                     response_text = result.get('message', 'Failed to cancel event.')
@@ -627,33 +783,23 @@ def handle_query():
         elif intent == 'quit':
             response_text = "Goodbye!"
         
-        # Format events for response
-        formatted_events = []
-        for event in events:
-            formatted_events.append({
-                'id': event.get('id'),
-                'summary': event.get('summary', 'No title'),
-                'start': event.get('start').isoformat() if event.get('start') else None,
-                'end': event.get('end').isoformat() if event.get('end') else None,
-                'location': event.get('location', ''),
-            })
-        
-        # Reload events if modification was made
-        if intent in ['create', 'modify', 'cancel']:
+        # Pick the one event list to return: the database after a change (it already reflects it),
+        # or the events fetched for context when a modify/cancel didn't go through
+        if mutated:
             try:
-                result = orch.calendar_agent.get_all_events(store_in_db=False)
-                all_events = result.get('events', []) if result and result.get('success') else []
-                formatted_events = []
-                for event in all_events:
-                    formatted_events.append({
-                        'id': event.get('id'),
-                        'summary': event.get('summary', 'No title'),
-                        'start': event.get('start').isoformat() if event.get('start') else None,
-                        'end': event.get('end').isoformat() if event.get('end') else None,
-                        'location': event.get('location', ''),
-                    })
-            except:
-                pass
+                orch.db_ready.wait(timeout=constants.DB_SEED_TIMEOUT_SEC)
+                events = orch.calendar_agent.get_stored_events()
+            except sqlite3.Error:
+                logger.exception("Could not reload stored events")
+        elif intent in ['modify', 'cancel']:
+            events = events_data
+        
+        # Format events for response
+        formatted_events = format_events(events)
+        
+        # Catch any drift from the local update after the response is on its way
+        if mutated and hold_orchestrator(orch):
+            background_executor.submit(reconcile_db, orch, session.get('session_id'))
         
         return jsonify({
             'success': True,
@@ -663,7 +809,10 @@ def handle_query():
         })
         
     except Exception as e:
+        logger.exception("/api/query error")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        release_orchestrator(orch)
 
 
 @app.route('/api/tts', methods=['POST'])
@@ -679,56 +828,36 @@ def text_to_speech():
         orch = init_orchestrator()
         
         if not orch.tts_agent:
-            print("TTS agent not available")
+            logger.warning("TTS agent not available")
             return jsonify({'success': False, 'error': 'TTS not configured. Please set ELEVENLABS_API_KEY in .env file.'}), 503
         
-        print(f"Generating audio for text: {text[:50]}...")
-        
-        # Generate audio
-        try:
-            audio_bytes = orch.tts_agent.generate_audio(text)
-        except Exception as e:
-            print(f"Exception in generate_audio: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'success': False, 'error': f'Failed to generate audio: {str(e)}'}), 500
-        
-        if not audio_bytes:
-            print("Failed to generate audio bytes - returned None or empty")
-            return jsonify({'success': False, 'error': 'Failed to generate audio (returned None)'}), 500
-        
-        if len(audio_bytes) == 0:
-            print("Generated audio is empty (0 bytes)")
-            return jsonify({'success': False, 'error': 'Generated audio is empty'}), 500
-        
-        print(f"Generated audio: {len(audio_bytes)} bytes")
+        logger.debug("Generating audio for text: %.50s", text)
         
-        # Save to temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_file.write(audio_bytes)
-        temp_file.close()
+        # Stream chunks to the client as ElevenLabs (or the clip cache) produces them;
+        # wait for the first one so a failed generation can still return an error status
+        audio = orch.tts_agent.iter_audio(text)
+        first_chunk = next(audio, None)
+        if first_chunk is None:
+            logger.error("Failed to generate audio - nothing was produced")
+            return jsonify({'success': False, 'error': 'Failed to generate audio'}), 500
         
-        # Return audio file
-        return send_file(
-            temp_file.name,
+        return Response(
+            chain([first_chunk], audio),
             mimetype='audio/mpeg',
-            as_attachment=False,
-            download_name='response.mp3'
+            headers={'Content-Disposition': 'inline; filename=response.mp3', 'Cache-Control': 'no-cache'}
         )
         
     except Exception as e:
-        print(f"TTS error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("TTS error")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 if __name__ == '__main__':
     # Allow external connections for testing on local network
     # Set host='0.0.0.0' to allow connections from other devices on your network
-    # For production, use a proper WSGI server like gunicorn
+    # For production, run under gunicorn: gunicorn -c gunicorn.conf.py app:app
     host = os.getenv('FLASK_HOST', '127.0.0.1')  # Default to localhost only
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host=host, port=port, debug=debug)
+    app.run(host=host, port=port, debug=debug, threaded=True)
 
@@ -1,12 +1,61 @@
 """Handles Google Calendar OAuth authentication for web app users."""
 import os
-import pickle
-from flask import session, redirect, request, url_for
+import base64
+import json
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+from flask import g, session, redirect, request, url_for
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
 import constants
+from google_transport import shared_http, auth_request, build_calendar_service
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _load_client_config() -> dict:
+    """
+    Load the OAuth client config, from GOOGLE_CREDENTIALS_BASE64 or else the credentials file.
+    
+    Raises:
+        ValueError: If neither source can be loaded
+    """
+    client_secrets_file = constants.CREDENTIALS_FILE
+    
+    # Try to load from environment variable first (for Railway deployment)
+    credentials_base64 = os.getenv('GOOGLE_CREDENTIALS_BASE64')
+    if credentials_base64:
+        # Decode from base64
+        try:
+            credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
+            client_config = json.loads(credentials_json)
+            logger.info("Loaded credentials from GOOGLE_CREDENTIALS_BASE64 environment variable")
+        except Exception as e:
+            logger.warning("Error decoding GOOGLE_CREDENTIALS_BASE64: %s; falling back to %s", e, client_secrets_file)
+            # Fall back to file
+            try:
+                with open(client_secrets_file, 'r') as f:
+                    client_config = json.load(f)
+                logger.info("Loaded credentials from %s", client_secrets_file)
+            except FileNotFoundError:
+                raise ValueError(f"Could not load credentials: GOOGLE_CREDENTIALS_BASE64 decode failed and {client_secrets_file} not found")
+    else:
+        # Load from file (for local development)
+        try:
+            with open(client_secrets_file, 'r') as f:
+                client_config = json.load(f)
+            logger.info("Loaded credentials from %s", client_secrets_file)
+        except FileNotFoundError:
+            raise ValueError(f"Could not load credentials: GOOGLE_CREDENTIALS_BASE64 not set and {client_secrets_file} not found. Please set GOOGLE_CREDENTIALS_BASE64 environment variable or provide credentials.json file.")
+    return client_config
 
 
 class AuthManager:
@@ -20,36 +69,8 @@ class AuthManager:
         # Note: Both localhost and 127.0.0.1 work, but must match Google Cloud Console exactly
         self.redirect_uri = os.getenv('OAUTH_REDIRECT_URI', 'http://127.0.0.1:5000/auth/callback')
         
-        # Load client config from credentials file or environment variable
-        import json
-        import base64
-        
-        # Try to load from environment variable first (for Railway deployment)
-        credentials_base64 = os.getenv('GOOGLE_CREDENTIALS_BASE64')
-        if credentials_base64:
-            # Decode from base64
-            try:
-                credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
-                client_config = json.loads(credentials_json)
-                print("✓ Loaded credentials from GOOGLE_CREDENTIALS_BASE64 environment variable")
-            except Exception as e:
-                print(f"Error decoding GOOGLE_CREDENTIALS_BASE64: {e}")
-                print("Falling back to credentials.json file...")
-                # Fall back to file
-                try:
-                    with open(self.client_secrets_file, 'r') as f:
-                        client_config = json.load(f)
-                    print(f"✓ Loaded credentials from {self.client_secrets_file}")
-                except FileNotFoundError:
-                    raise ValueError(f"Could not load credentials: GOOGLE_CREDENTIALS_BASE64 decode failed and {self.client_secrets_file} not found")
-        else:
-            # Load from file (for local development)
-            try:
-                with open(self.client_secrets_file, 'r') as f:
-                    client_config = json.load(f)
-                print(f"✓ Loaded credentials from {self.client_secrets_file}")
-            except FileNotFoundError:
-                raise ValueError(f"Could not load credentials: GOOGLE_CREDENTIALS_BASE64 not set and {self.client_secrets_file} not found. Please set GOOGLE_CREDENTIALS_BASE64 environment variable or provide credentials.json file.")
+        # Load client config from credentials file or environment variable (parsed once per process)
+        client_config = _load_client_config()
         
         # Extract web app credentials
         if 'web' in client_config:
@@ -60,24 +81,33 @@ class AuthManager:
         else:
             raise ValueError("Invalid credentials file format")
         
-        # Create OAuth flow with web app configuration
-        self.flow = Flow.from_client_config(
-            client_config={
-                'web': {
-                    'client_id': client_info['client_id'],
-                    'client_secret': client_info['client_secret'],
-                    'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
-                    'token_uri': 'https://oauth2.googleapis.com/token',
-                    'redirect_uris': [self.redirect_uri]
-                }
-            },
+        # Web app client configuration, built once and read-only since every login shares it;
+        # each login gets its own Flow built from it, since a Flow keeps the fetched token (and state) on itself
+        self._flow_config = MappingProxyType({
+            'web': MappingProxyType({
+                'client_id': client_info['client_id'],
+                'client_secret': client_info['client_secret'],
+                'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
+                'token_uri': 'https://oauth2.googleapis.com/token',
+                'redirect_uris': (self.redirect_uri,)
+            })
+        })
+        
+        # sha256(access token) -> (service, expires at), in least-recently-used order
+        self._services = OrderedDict()
+        self._services_lock = threading.Lock()
+    
+    def _new_flow(self):
+        """Create an OAuth flow for one login from the cached client configuration."""
+        return Flow.from_client_config(
+            client_config=self._flow_config,
             scopes=self.scopes,
             redirect_uri=self.redirect_uri
         )
     
     def get_authorization_url(self):
         """Get the authorization URL for OAuth flow."""
-        authorization_url, state = self.flow.authorization_url(
+        authorization_url, state = self._new_flow().authorization_url(
             access_type='offline',
             include_granted_scopes='true',
             prompt='consent'  # Force consent screen to get refresh token
@@ -86,54 +116,124 @@ class AuthManager:
     
     def get_credentials_from_code(self, code):
         """Exchange authorization code for credentials."""
-        self.flow.fetch_token(code=code)
-        credentials = self.flow.credentials
-        return credentials
+        flow = self._new_flow()
+        flow.fetch_token(code=code)
+        return flow.credentials
     
     def build_service(self, credentials):
-        """Build Google Calendar service from credentials."""
-        return build('calendar', constants.CALENDAR_API_VERSION, credentials=credentials)
+        """
+        Build Google Calendar service from credentials.
+        
+        Services are cached per access token, so repeated requests with the same
+        token skip parsing the discovery document and building the resource tree.
+        """
+        key = hashlib.sha256(credentials.token.encode()).hexdigest() if credentials.token else None
+        now = time.monotonic()
+        if key:
+            with self._services_lock:
+                entry = self._services.get(key)
+                if entry is not None:
+                    if now < entry[1]:
+                        self._services.move_to_end(key)
+                        return entry[0]
+                    del self._services[key]
+        
+        # Per-user credentials over the process-wide keep-alive connection pool
+        authed_http = AuthorizedHttp(credentials, http=shared_http)
+        service = build_calendar_service(authed_http)
+        
+        if key:
+            ttl = constants.SERVICE_CACHE_TTL_SEC
+            if credentials.expiry:
+                # expiry is naive UTC
+                ttl = min(ttl, (credentials.expiry - datetime.utcnow()).total_seconds())
+            if ttl > 0:
+                with self._services_lock:
+                    self._services[key] = (service, now + ttl)
+                    self._services.move_to_end(key)
+                    if len(self._services) > constants.SERVICE_CACHE_MAXSIZE:
+                        self._services.popitem(last=False)
+        return service
     
     def refresh_credentials_if_needed(self, credentials):
-        """Refresh credentials if expired."""
-        if credentials and credentials.expired and credentials.refresh_token:
-            credentials.refresh(Request())
+        """Refresh credentials if expired or within TOKEN_REFRESH_SKEW_SEC of expiring."""
+        if not credentials or not credentials.refresh_token:
+            return credentials
+        expiring = credentials.expiry is not None and (
+            credentials.expiry - datetime.utcnow() < timedelta(seconds=constants.TOKEN_REFRESH_SKEW_SEC)
+        )
+        if credentials.expired or expiring:
+            credentials.refresh(auth_request)
         return credentials
 
 
+def credentials_to_session(credentials) -> dict:
+    """Serialize credentials for the Flask session (expiry as an ISO string, naive UTC)."""
+    return {
+        'token': credentials.token,
+        'refresh_token': credentials.refresh_token,
+        'token_uri': credentials.token_uri,
+        'client_id': credentials.client_id,
+        'client_secret': credentials.client_secret,
+        'scopes': credentials.scopes,
+        'expiry': credentials.expiry.isoformat() if credentials.expiry else None
+    }
+
+
+def credentials_from_session(creds_dict: dict) -> Credentials:
+    """Rebuild credentials stored by credentials_to_session (older sessions have no expiry)."""
+    get = creds_dict.get
+    expiry = get('expiry')
+    return Credentials(
+        creds_dict['token'],
+        refresh_token=get('refresh_token'),
+        token_uri=get('token_uri'),
+        client_id=get('client_id'),
+        client_secret=get('client_secret'),
+        scopes=get('scopes'),
+        expiry=datetime.fromisoformat(expiry) if expiry else None
+    )
+
+
+_auth_manager = None
+_auth_manager_lock = threading.Lock()
+
+
+def get_auth_manager():
+    """Return the process-wide AuthManager, creating it on first use."""
+    global _auth_manager
+    with _auth_manager_lock:
+        if _auth_manager is None:
+            _auth_manager = AuthManager()
+        return _auth_manager
+
+
 def get_user_calendar_service():
     """Get calendar service for current user session."""
     if 'credentials' not in session:
-        print(f"DEBUG: No credentials in session")
+        logger.debug("No credentials in session")
         return None
     
     try:
-        # Load credentials from session
+        # Load credentials from session, once per request
         creds_dict = session['credentials']
-        print(f"DEBUG: Loading credentials from session. Keys: {list(creds_dict.keys())}")
-        credentials = Credentials(**creds_dict)
+        credentials = g.get('credentials')
+        if credentials is None or credentials.token != creds_dict.get('token'):
+            credentials = credentials_from_session(creds_dict)
         
         # Refresh if needed
-        auth_manager = AuthManager()
+        auth_manager = get_auth_manager()
         credentials = auth_manager.refresh_credentials_if_needed(credentials)
         
-        # Update session with refreshed credentials
-        session['credentials'] = {
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        }
+        # Update session only when the token changed, so unchanged requests don't re-send the cookie
+        if credentials.token != creds_dict.get('token'):
+            session['credentials'] = credentials_to_session(credentials)
+        g.credentials = credentials
         
         # Build and return service
         service = auth_manager.build_service(credentials)
-        print(f"DEBUG: Calendar service built successfully")
         return service
     except Exception as e:
-        print(f"ERROR getting calendar service: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting calendar service")
         return None
 
@@ -1,11 +1,11 @@
 """Simple calendar manager for Google Calendar API."""
 import os
-import pickle
+import json
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
 import constants
+from google_transport import shared_http, auth_request, build_calendar_service
 
 
 class CalendarManager:
@@ -21,25 +21,40 @@ class CalendarManager:
         self.service = None
         self._authenticate()
     
+    def _save_token(self, creds):
+        """Write credentials to the JSON token file."""
+        with open(self.token_file, 'w') as token:
+            token.write(creds.to_json())
+    
+    def _load_legacy_token(self):
+        """Load a pickled token left by older versions and rewrite it as JSON."""
+        import pickle
+        with open(constants.LEGACY_TOKEN_FILE, 'rb') as token:
+            creds = pickle.load(token)
+        self._save_token(creds)
+        os.remove(constants.LEGACY_TOKEN_FILE)
+        return creds
+    
     def _authenticate(self):
         """Authenticate with Google Calendar API."""
         creds = None
         
         if os.path.exists(self.token_file):
-            with open(self.token_file, 'rb') as token:
-                creds = pickle.load(token)
+            with open(self.token_file, 'r') as token:
+                creds = Credentials.from_authorized_user_info(json.load(token), constants.CALENDAR_SCOPES)
+        elif os.path.exists(constants.LEGACY_TOKEN_FILE):
+            creds = self._load_legacy_token()
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
+                creds.refresh(auth_request)
             else:
                 if not os.path.exists(self.credentials_file):
                     raise FileNotFoundError(f"Credentials file not found: {self.credentials_file}")
                 flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, constants.CALENDAR_SCOPES)
                 creds = flow.run_local_server(port=constants.OAUTH_PORT)
             
-            with open(self.token_file, 'wb') as token:
-                pickle.dump(creds, token)
+            self._save_token(creds)
         
-        self.service = build('calendar', constants.CALENDAR_API_VERSION, credentials=creds)
+        self.service = build_calendar_service(AuthorizedHttp(creds, http=shared_http))
 
@@ -2,17 +2,55 @@
 
 # Database configuration
 DB_PATH = 'calendar_events.db'
+# Milliseconds a connection waits on a locked database before raising SQLITE_BUSY
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_SIZE_KB = 20000
 
 # Google Calendar API configuration
 CALENDAR_SCOPES = ['https://www.googleapis.com/auth/calendar']
 CALENDAR_API_VERSION = 'v3'
 CALENDAR_ID = 'primary'
 CREDENTIALS_FILE = 'credentials.json'
-TOKEN_FILE = 'token.pickle'
+TOKEN_FILE = 'token.json'
+# Pickled token from older versions, migrated to TOKEN_FILE on first load
+LEGACY_TOKEN_FILE = 'token.pickle'
 OAUTH_PORT = 0
+# Shared HTTP transport for Google API calls
+HTTP_TIMEOUT = 10
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 50
+HTTP_RETRY_TOTAL = 3
+HTTP_RETRY_BACKOFF = 0.3
+# Partial response mask: only the event fields CalendarAgent reads
+EVENT_LIST_FIELDS = 'items(id,summary,description,start,end,location,attendees/email,status,htmlLink),nextPageToken,nextSyncToken'
+# Conflict checks only read these fields, and a proposed slot rarely overlaps many events
+CONFLICT_LIST_FIELDS = 'items(id,summary,start,end,location)'
+CONFLICT_MAX_RESULTS = 50
 
 # Number of most recent events to retrieve
 NUM_RECENT_EVENTS = 6
+# Days ahead a full calendar sync covers (recurring events are expanded into instances)
+SYNC_HORIZON_DAYS = 180
+
+# Seconds to reuse a fetched event list before calling Google Calendar again
+EVENTS_CACHE_TTL_SEC = 30
+# Worker threads for web-app work done after the response (database reconciliation)
+BACKGROUND_WORKERS = 4
+# Worker threads for calls a request overlaps with its own work (fetching events during intent detection)
+PREFETCH_WORKERS = 8
+# Seconds a request waits for a new session's initial database sync before reading anyway
+DB_SEED_TIMEOUT_SEC = 30
+# Built Calendar API services kept per access token (bounded, and never past the token's expiry)
+SERVICE_CACHE_MAXSIZE = 256
+SERVICE_CACHE_TTL_SEC = 60 * 60
+# Refresh access tokens this many seconds before they expire, so in-flight requests don't hit expiry
+TOKEN_REFRESH_SKEW_SEC = 60
+# Seconds to reuse a user's calendar timezone across sessions
+CALENDAR_TZ_CACHE_TTL_SEC = 24 * 60 * 60
+# Per-session orchestrators kept in memory; idle ones expire with the session cookie
+ORCHESTRATOR_CACHE_MAXSIZE = 1000
+ORCHESTRATOR_IDLE_TTL_SEC = 24 * 60 * 60
 
 # Event display limits
 MAX_EVENTS_FOR_QA = 20
@@ -23,12 +61,31 @@ MAX_EVENTS_FOR_PARSER = 10
 LLM_TEMPERATURE = 0.3
 LLM_MAX_TOKENS = 200
 LLM_MODEL = "llama-3.1-8b-instant"
+# Fast model for short, structured outputs (cancel parsing, conflict messages)
+LLM_MODEL_FAST = "llama-3.1-8b-instant"
+LLM_FAST_MAX_TOKENS = 128
+
+# Connection pool limits for async HTTP clients
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
 
 # LLM parameters for specific agents
 INTENT_AGENT_TEMPERATURE = 0.1
-INTENT_AGENT_MAX_TOKENS = 10
+INTENT_AGENT_MAX_TOKENS = 3
+INTENT_CACHE_MAXSIZE = 4096  # shared by every session in the process
 VALIDATION_AGENT_TEMPERATURE = 0.1
 VALIDATION_AGENT_MAX_TOKENS = 100
+VALIDATION_CACHE_MAXSIZE = 256
+# Concurrent API calls per batch (SQL generation, validation, TTS)
+BATCH_CONCURRENCY = 8
+SQL_CACHE_MAXSIZE = 512
+
+# LLM response cache
+LLM_CACHE_DB_PATH = 'llm_cache.db'
+SEMANTIC_CACHE_MODEL = "all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAXSIZE = 1024  # rows kept per cache file, oldest evicted first
+EXACT_CACHE_MAXSIZE = 2048
 
 # Voice transcription parameters
 TRANSCRIPTION_TIMEOUT = 10
@@ -38,4 +95,13 @@ AMBIENT_NOISE_DURATION = 1
 # ElevenLabs TTS configuration
 ELEVENLABS_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"  # Rachel voice (default). Get voice IDs from https://elevenlabs.io/app/voices
 ELEVENLABS_MODEL = "eleven_multilingual_v2"  # Free tier compatible model
+TTS_CACHE_DIR = None  # Defaults to <system temp dir>/tts_cache
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Recently played clips are also kept in RAM, shared by every session in the process
+TTS_MEMORY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+TTS_MEMORY_CLIP_MAX_BYTES = 1024 * 1024  # longer clips are only cached on disk
+# Write buffer for streamed clips, so small chunks are batched into few write() calls
+TTS_WRITE_BUFFER_BYTES = 1 << 20
+# Read size when replaying a cached clip to a client
+TTS_STREAM_CHUNK_BYTES = 64 * 1024
 
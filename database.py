@@ -1,10 +1,36 @@
 """Simple database initialization for storing calendar events."""
 import sqlite3
+import threading
 import constants
 
 
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Open a connection with the pragmas every events-database connection uses.
+    
+    Connections are in autocommit mode (isolation_level=None), so write batches
+    must use explicit BEGIN IMMEDIATE ... COMMIT. They may be shared across
+    threads; callers guard them with their own lock.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    conn.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        f"PRAGMA busy_timeout={constants.SQLITE_BUSY_TIMEOUT_MS};"
+        "PRAGMA temp_store=MEMORY;"
+        f"PRAGMA mmap_size={constants.SQLITE_MMAP_SIZE};"
+        f"PRAGMA cache_size=-{constants.SQLITE_CACHE_SIZE_KB};"
+    )
+    return conn
+
+
 class CalendarDatabase:
-    """Simple SQLite database for storing calendar events."""
+    """
+    Simple SQLite database for storing calendar events.
+    
+    Holds one persistent connection (see connect()); share it through conn and
+    hold lock while using it.
+    """
     
     def __init__(self, db_path: str = None):
         """
@@ -16,14 +42,26 @@ class CalendarDatabase:
         if db_path is None:
             db_path = constants.DB_PATH
         self.db_path = db_path
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
         self._create_database()
     
+    def _write(self, *statements):
+        """Run statements in one BEGIN IMMEDIATE transaction on the shared connection."""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+    
     def _create_database(self):
         """Create database schema."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._write(
+            '''
             CREATE TABLE IF NOT EXISTS events (
                 id TEXT PRIMARY KEY,
                 summary TEXT NOT NULL,
@@ -37,20 +75,31 @@ class CalendarDatabase:
                 created_at TEXT NOT NULL,
                 updated_at TEXT NOT NULL
             )
-        ''')
-        
-        # Create index for faster queries
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_start_time ON events(start_time)
-        ''')
-        
-        conn.commit()
-        conn.close()
+            ''',
+            # Upcoming/overlap queries filter on end_time and order by start_time; with both
+            # columns in the index they are answered in index order without touching rows
+            # that don't match. It also covers every lookup the old start_time-only index served.
+            'CREATE INDEX IF NOT EXISTS idx_start_end ON events(start_time, end_time)',
+            'DROP INDEX IF EXISTS idx_start_time',
+            # Incremental sync tokens per calendar
+            '''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                calendar_id TEXT PRIMARY KEY,
+                sync_token TEXT,
+                updated_at TEXT NOT NULL
+            )
+            '''
+        )
     
     def clear_all_events(self):
-        """Clear all events from the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM events')
-        conn.commit()
-        conn.close()
+        """Clear all events from the database (and the sync token, forcing a full sync)."""
+        self._write('DELETE FROM events', 'DELETE FROM sync_state')
+    
+    def clear_sync_state(self):
+        """Forget the sync tokens, so the next sync is a full one."""
+        self._write('DELETE FROM sync_state')
+    
+    def close(self):
+        """Close the persistent connection."""
+        with self.lock:
+            self.conn.close()
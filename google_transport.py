@@ -0,0 +1,112 @@
+"""Pooled HTTP transport and JSON model shared by all Google Calendar API services."""
+from functools import lru_cache
+import httplib2
+import orjson
+import requests
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.model import JsonModel
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import constants
+
+
+class PooledHttp:
+    """httplib2-compatible transport backed by a pooled requests.Session.
+
+    googleapiclient and google_auth_httplib2 only call request() and read the
+    httplib2.Response it returns, so this can be passed wherever an
+    httplib2.Http is expected while keeping connections alive across services.
+    """
+
+    def __init__(self, session: requests.Session, timeout: float = None):
+        """
+        Initialize transport.
+
+        Args:
+            session: requests.Session with a pooled HTTPAdapter mounted
+            timeout: Per-request timeout in seconds
+        """
+        self.session = session
+        self.timeout = timeout
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None, **kwargs):
+        """Send a request and return (httplib2.Response, content) like httplib2.Http.request."""
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # requests has already decoded the body
+        info.pop('content-encoding', None)
+        info['status'] = str(response.status_code)
+
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+    def close(self):
+        """No-op: the session is shared by every service built on it."""
+        pass
+
+
+class OrjsonModel(JsonModel):
+    """JsonModel that encodes request bodies and decodes responses with orjson."""
+
+    def serialize(self, body_value):
+        """Encode a request body (googleapiclient expects a str)."""
+        if isinstance(body_value, dict) and 'data' not in body_value and self._data_wrapper:
+            body_value = {'data': body_value}
+        return orjson.dumps(body_value).decode()
+
+    def deserialize(self, content):
+        """Decode a response body; non-JSON content is returned as text."""
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
+
+def _build_session() -> requests.Session:
+    """Create a session that keeps connections to googleapis.com alive and retries transient errors."""
+    # The only retry layer for Google calls (no execute(num_retries=...) on top). Once retries
+    # are used up the last 429/5xx response is returned, so callers still get an HttpError
+    # rather than a requests RetryError
+    retry = Retry(
+        total=constants.HTTP_RETRY_TOTAL,
+        backoff_factor=constants.HTTP_RETRY_BACKOFF,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=constants.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=constants.HTTP_POOL_MAXSIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    return session
+
+
+# One pool for the whole process; per-user credentials are layered on top with AuthorizedHttp
+shared_session = _build_session()
+shared_http = PooledHttp(shared_session, timeout=constants.HTTP_TIMEOUT)
+# Token refreshes go over the same pool instead of a new session (and TLS handshake) each time
+auth_request = Request(session=shared_session)
+json_model = OrjsonModel()
+
+
+@lru_cache(maxsize=1)
+def calendar_discovery_doc() -> str:
+    """The Calendar API discovery document bundled with googleapiclient, read once per process."""
+    doc = get_static_doc('calendar', constants.CALENDAR_API_VERSION)
+    if doc is None:
+        raise RuntimeError(f"googleapiclient has no bundled discovery document for calendar {constants.CALENDAR_API_VERSION}")
+    return doc
+
+
+def build_calendar_service(http):
+    """Build a Calendar API service from the bundled discovery document (no discovery fetch or file read)."""
+    return build_from_document(calendar_discovery_doc(), http=http, model=json_model)
@@ -0,0 +1,16 @@
+"""Gunicorn settings for the web app (start with: gunicorn -c gunicorn.conf.py app:app)."""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Requests spend most of their time waiting on Google Calendar, Groq and ElevenLabs,
+# so threads let them overlap. Per-session orchestrators, their database connections
+# and the in-memory caches live in the worker process, so keep one worker by default;
+# a second worker would rebuild them for any session it happens to serve.
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+# Long LLM + TTS round trips must not trip the worker timeout
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
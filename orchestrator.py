@@ -1,17 +1,27 @@
 """Simple orchestrator for calling agents."""
 from agents.calendar_agent import CalendarAgent
-from agents.sql_agent import SQLAgent
 from agents.database_agent import DatabaseAgent
-from agents.qa_agent import QAAgent
 from agents.timezone_agent import TimezoneAgent
 from agents.response_agent import ResponseAgent
 from agents.intent_agent import IntentAgent
 from agents.calendar_management_agent import CalendarManagementAgent
 from agents.action_parser_agent import ActionParserAgent
-from agents.validation_agent import ValidationAgent
+from agents import groq_client
+from agents.time_format import parse_local_datetime
 from datetime import datetime
+from functools import cached_property
+import asyncio
+import re
+import threading
 import constants
 
+# Cheap check for a date/time mention, used to decide whether to speculatively parse a create request
+_TIME_MENTION_RE = re.compile(
+    r'\b(\d{1,2}(:\d{2})?\s*(am|pm)|\d{1,2}:\d{2}|noon|midnight|today|tonight|tomorrow|'
+    r'monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b',
+    re.IGNORECASE
+)
+
 
 class Orchestrator:
     """Orchestrator that coordinates agents."""
@@ -27,6 +37,9 @@ class Orchestrator:
         if db_path is None:
             db_path = constants.DB_PATH
         
+        # Connect to Groq while the calendar timezone is fetched and the user picks theirs
+        threading.Thread(target=groq_client.warm_up, daemon=True).start()
+        
         # Get and print Google Calendar timezone
         try:
             calendar_info = calendar_service.calendars().get(calendarId=constants.CALENDAR_ID).execute()
@@ -42,13 +55,106 @@ class Orchestrator:
         
         self.intent_agent = IntentAgent()
         self.action_parser_agent = ActionParserAgent()
-        self.validation_agent = ValidationAgent()
         self.calendar_agent = CalendarAgent(calendar_service, db_path, self.timezone_manager)
         self.calendar_management_agent = CalendarManagementAgent(calendar_service, self.timezone_manager)
-        self.qa_agent = QAAgent()
-        self.sql_agent = SQLAgent(db_path, qa_agent=self.qa_agent, timezone_manager=self.timezone_manager)
+        self.db_path = db_path
         self.database_agent = DatabaseAgent(db_path, self.timezone_manager)
         self.response_agent = ResponseAgent()
+        
+        # One long-lived loop so the async clients' pooled connections stay valid between queries
+        self._loop = asyncio.new_event_loop()
+    
+    # Agents only some turns need are imported and built on first use, like the transcription agent
+    @cached_property
+    def validation_agent(self):
+        """Checks a create/modify/cancel against the request; needed only after a successful write."""
+        from agents.validation_agent import ValidationAgent
+        return ValidationAgent()
+    
+    @cached_property
+    def qa_agent(self):
+        """Answers questions from the event list when SQL generation fails."""
+        from agents.qa_agent import QAAgent
+        return QAAgent()
+    
+    @cached_property
+    def sql_agent(self):
+        """Turns questions into SQL; needed only for queries."""
+        from agents.sql_agent import SQLAgent
+        return SQLAgent(self.db_path, qa_agent=self.qa_agent, timezone_manager=self.timezone_manager)
+    
+    def _input_reader(self):
+        """
+        Pick the input source once, rather than retrying the import every turn.
+        
+        Returns:
+            Function returning the next user request
+        """
+        # Get voice input (for CLI - web app uses text input)
+        try:
+            from agents.transcription_agent import TranscriptionAgent
+        except ImportError:
+            # Fallback to text input if transcription not available
+            return lambda: input("\nEnter your query (or 'quit' to exit): ").strip()
+        
+        self.transcription_agent = TranscriptionAgent()
+        return self.transcription_agent.transcribe
+    
+    def _current_date(self) -> str:
+        """Today's date in the user's timezone, for parser context."""
+        if self.timezone_manager:
+            return self.timezone_manager.now_in_user_tz().strftime('%Y-%m-%d')
+        return datetime.now().strftime('%Y-%m-%d')
+    
+    def _create_times(self, params: dict):
+        """Parse the parser's start/end strings and localize them to the user timezone."""
+        start_dt = parse_local_datetime(params['start_time'])
+        end_dt = parse_local_datetime(params['end_time'])
+        if self.timezone_manager:
+            start_dt = start_dt.replace(tzinfo=self.timezone_manager.user_timezone)
+            end_dt = end_dt.replace(tzinfo=self.timezone_manager.user_timezone)
+        return start_dt, end_dt
+    
+    async def _aspeculate_create(self, user_input: str):
+        """Parse a create request and check it for conflicts, returning (params, conflicts or None)."""
+        params = await self.action_parser_agent.aparse_create(user_input, current_date=self._current_date())
+        try:
+            start_dt, end_dt = self._create_times(params)
+        except Exception:
+            return params, None
+        return params, await self.calendar_management_agent.acheck_conflicts(start_dt, end_dt)
+    
+    async def _aclassify(self, user_input: str):
+        """
+        Identify intent while the upcoming events are fetched.
+        
+        If the query mentions a time, the create parse and conflict check start
+        alongside intent classification; their result is returned only when the
+        intent is 'create' and cancelled otherwise.
+        
+        Returns:
+            Tuple of (intent, (params, conflicts) or None)
+        """
+        speculative = None
+        if _TIME_MENTION_RE.search(user_input):
+            speculative = asyncio.ensure_future(self._aspeculate_create(user_input))
+        
+        intent, _ = await asyncio.gather(
+            self.intent_agent.aidentify_intent(user_input),
+            self.calendar_agent.aget_all_events(store_in_db=False)
+        )
+        
+        if speculative is None:
+            return intent, None
+        if intent == 'create':
+            try:
+                return intent, await speculative
+            except Exception:
+                return intent, None
+        
+        speculative.cancel()
+        await asyncio.gather(speculative, return_exceptions=True)
+        return intent, None
     
     def run(self):
         """Main run loop."""
@@ -56,51 +162,38 @@ class Orchestrator:
         
         # Clear database and repopulate with fresh events
         print("Syncing calendar events to database...")
-        from database import CalendarDatabase
-        db = CalendarDatabase(self.calendar_agent.db_path)
-        db.clear_all_events()
-        self.calendar_agent.get_all_events(store_in_db=True)
+        self.calendar_agent.resync_events()
         print("Ready!\n")
         
         # Print structured database before user input
-        print("=" * 60)
-        print("DATABASE CONTENTS:")
-        print("=" * 60)
+        rule = "=" * 60
+        print(f"{rule}\nDATABASE CONTENTS:\n{rule}")
         all_events = self.database_agent.execute_query("SELECT * FROM events ORDER BY start_time", print_raw=False)
         if all_events:
-            for event in all_events:
-                # Events are already in user timezone from database_agent
-                start = event['start']
-                end = event['end']
-                print(f"ID: {event['id']}")
-                print(f"  Summary: {event['summary']}")
-                print(f"  Start: {start.strftime('%Y-%m-%d %I:%M %p')}")
-                print(f"  End: {end.strftime('%Y-%m-%d %I:%M %p')}")
-                print(f"  Location: {event.get('location', 'N/A')}")
-                print(f"  Attendees: {', '.join(event.get('attendees', [])) if event.get('attendees') else 'None'}")
-                print()
+            # Events are already in user timezone from database_agent; one write for the whole listing
+            print("\n".join(
+                f"ID: {event.id}\n"
+                f"  Summary: {event.summary}\n"
+                f"  Start: {event.start:%Y-%m-%d %I:%M %p}\n"
+                f"  End: {event.end:%Y-%m-%d %I:%M %p}\n"
+                f"  Location: {event.location}\n"
+                f"  Attendees: {', '.join(event.attendees) if event.attendees else 'None'}\n"
+                for event in all_events
+            ))
         else:
             print("No events in database.")
-        print("=" * 60)
-        print()
+        print(f"{rule}\n")
         
+        read_input = self._input_reader()
         while True:
             try:
-                # Get voice input (for CLI - web app uses text input)
-                try:
-                    from agents.transcription_agent import TranscriptionAgent
-                    if not hasattr(self, 'transcription_agent'):
-                        self.transcription_agent = TranscriptionAgent()
-                    user_input = self.transcription_agent.transcribe()
-                except (ImportError, ModuleNotFoundError):
-                    # Fallback to text input if transcription not available
-                    user_input = input("\nEnter your query (or 'quit' to exit): ").strip()
+                user_input = read_input()
                 
                 if not user_input:
                     continue
                 
-                # Identify user intent
-                intent = self.intent_agent.identify_intent(user_input)
+                # Identify user intent while the event list is fetched (warms the events cache)
+                intent, speculative_create = self._loop.run_until_complete(self._aclassify(user_input))
                 
                 if intent == 'quit':
                     print("Goodbye!")
@@ -117,7 +210,7 @@ class Orchestrator:
                     if sql_query:
                         # SQL succeeded, execute query
                         print(f"SQL Query: {sql_query}")
-                        events = self.database_agent.execute_query(sql_query, print_raw=False)
+                        events = self.database_agent.execute_query(sql_query, print_raw=False, limit=constants.MAX_EVENTS_FOR_RESPONSE)
                         
                         # Generate conversational response using LLM
                         response = self.response_agent.generate_response(user_input, events)
@@ -125,14 +218,12 @@ class Orchestrator:
                     # If sql_query is None, QA agent already handled it
                 
                 elif intent == 'create':
-                    # Get current date for context
-                    if self.timezone_manager:
-                        current_date = self.timezone_manager.now_in_user_tz().strftime('%Y-%m-%d')
+                    # Parse create parameters (already done alongside intent classification if a time was mentioned)
+                    if speculative_create:
+                        params, conflicts = speculative_create
                     else:
-                        current_date = datetime.now().strftime('%Y-%m-%d')
-                    
-                    # Parse create parameters
-                    params = self.action_parser_agent.parse_create(user_input, current_date=current_date)
+                        params = self.action_parser_agent.parse_create(user_input, current_date=self._current_date())
+                        conflicts = None
                     
                     if 'error' in params:
                         print(f"Error parsing request: {params['error']}")
@@ -142,20 +233,14 @@ class Orchestrator:
                         # Parse datetime strings
                         try:
                             print(f"Parsed params: {params}")
-                            start_dt = datetime.strptime(params['start_time'], '%Y-%m-%d %H:%M')
-                            end_dt = datetime.strptime(params['end_time'], '%Y-%m-%d %H:%M')
-                            
-                            print(f"Parsed start: {start_dt}, end: {end_dt}")
-                            
                             # Localize to user timezone
-                            if self.timezone_manager:
-                                start_dt = self.timezone_manager.user_timezone.localize(start_dt)
-                                end_dt = self.timezone_manager.user_timezone.localize(end_dt)
+                            start_dt, end_dt = self._create_times(params)
                             
                             print(f"After timezone: start={start_dt}, end={end_dt}")
                             
                             # Check for conflicts
-                            conflicts = self.calendar_management_agent.check_conflicts(start_dt, end_dt)
+                            if conflicts is None:
+                                conflicts = self.calendar_management_agent.check_conflicts(start_dt, end_dt)
                             if conflicts:
                                 # Generate conflict message
                                 proposed_event = {
@@ -180,30 +265,23 @@ class Orchestrator:
                             )
                             
                             if result.get('success'):
-                                # Refresh database
-                                from database import CalendarDatabase
-                                db = CalendarDatabase(self.calendar_agent.db_path)
-                                db.clear_all_events()
-                                self.calendar_agent.get_all_events(store_in_db=True)
+                                # Apply the change locally instead of re-syncing the whole calendar
+                                self.calendar_agent.upsert_event(result['event'])
                                 
                                 # Validate the creation
                                 event_id = result.get('event_id')
                                 if event_id:
                                     # Get the created event from database
-                                    validation_events = self.database_agent.execute_query(
-                                        f"SELECT * FROM events WHERE id = '{event_id}'", 
-                                        print_raw=False
-                                    )
-                                    if validation_events:
+                                    validation_event = self.database_agent.get_event_by_id(event_id)
+                                    if validation_event:
                                         validation_result = self.validation_agent.validate(
-                                            user_input, 'create', validation_events[0]
+                                            user_input, 'create', validation_event
                                         )
                                         if not validation_result.get('valid', True):
                                             print(f"Validation failed: {validation_result.get('message', 'Action did not match user request')}")
                                             continue
                                 
-                                print(result.get('message', 'Event created.'))
-                                print(f"Event ID: {result.get('event_id', 'N/A')}")
+                                print(f"{result.get('message', 'Event created.')}\nEvent ID: {result.get('event_id', 'N/A')}")
                             else:
                                 print(result.get('message', 'Failed to create event.'))
                                 if 'error' in result:
@@ -230,21 +308,24 @@ class Orchestrator:
                         end_dt = None
                         
                         if params.get('start_time'):
-                            start_dt = datetime.strptime(params['start_time'], '%Y-%m-%d %H:%M')
+                            start_dt = parse_local_datetime(params['start_time'])
                             if self.timezone_manager:
-                                start_dt = self.timezone_manager.user_timezone.localize(start_dt)
+                                start_dt = start_dt.replace(tzinfo=self.timezone_manager.user_timezone)
                         
                         if params.get('end_time'):
-                            end_dt = datetime.strptime(params['end_time'], '%Y-%m-%d %H:%M')
+                            end_dt = parse_local_datetime(params['end_time'])
                             if self.timezone_manager:
-                                end_dt = self.timezone_manager.user_timezone.localize(end_dt)
+                                end_dt = end_dt.replace(tzinfo=self.timezone_manager.user_timezone)
                         
                         # Check for conflicts (excluding the event being modified)
                         if start_dt:
                             # If end_dt not provided, get original event duration
-                            if not end_dt:
+                            original = next((e for e in events_data if e.get('id') == params['event_id']), None)
+                            if not end_dt and original is not None:
+                                # The events fetched during classification already carry it
+                                end_dt = start_dt + (original['end'] - original['start'])
+                            elif not end_dt:
                                 try:
-                                    from googleapiclient.discovery import build
                                     event = self.calendar_management_agent.service.events().get(
                                         calendarId=constants.CALENDAR_ID, eventId=params['event_id']
                                     ).execute()
@@ -294,21 +375,15 @@ class Orchestrator:
                         )
                         
                         if result.get('success'):
-                            # Refresh database
-                            from database import CalendarDatabase
-                            db = CalendarDatabase(self.calendar_agent.db_path)
-                            db.clear_all_events()
-                            self.calendar_agent.get_all_events(store_in_db=True)
+                            # Apply the change locally instead of re-syncing the whole calendar
+                            self.calendar_agent.upsert_event(result['event'])
                             
                             # Validate the modification
                             event_id = params['event_id']
-                            validation_events = self.database_agent.execute_query(
-                                f"SELECT * FROM events WHERE id = '{event_id}'", 
-                                print_raw=False
-                            )
-                            if validation_events:
+                            validation_event = self.database_agent.get_event_by_id(event_id)
+                            if validation_event:
                                 validation_result = self.validation_agent.validate(
-                                    user_input, 'modify', validation_events[0]
+                                    user_input, 'modify', validation_event
                                 )
                                 if not validation_result.get('valid', True):
                                     print(f"Validation failed: {validation_result.get('message', 'Action did not match user request')}")
@@ -335,23 +410,20 @@ class Orchestrator:
                     else:
                         print(f"Attempting to cancel event: {params['event_id']}")
                         # Cancel event
-                        result = self.calendar_management_agent.cancel_event(params['event_id'])
+                        result = self.calendar_management_agent.cancel_event(
+                            params['event_id'],
+                            summary=next((e.get('summary') for e in events_data if e.get('id') == params['event_id']), None)
+                        )
                         
                         if result.get('success'):
-                            # Refresh database
-                            from database import CalendarDatabase
-                            db = CalendarDatabase(self.calendar_agent.db_path)
-                            db.clear_all_events()
-                            self.calendar_agent.get_all_events(store_in_db=True)
+                            # Apply the change locally instead of re-syncing the whole calendar
+                            self.calendar_agent.delete_event(result['event_id'])
                             
                             # Validate the cancellation (event should not exist)
                             event_id = params['event_id']
-                            validation_events = self.database_agent.execute_query(
-                                f"SELECT * FROM events WHERE id = '{event_id}'", 
-                                print_raw=False
-                            )
+                            validation_event = self.database_agent.get_event_by_id(event_id)
                             validation_result = self.validation_agent.validate(
-                                user_input, 'cancel', validation_events[0] if validation_events else None
+                                user_input, 'cancel', validation_event
                             )
                             if not validation_result.get('valid', True):
                                 print(f"Validation failed: {validation_result.get('message', 'Action did not match user request')}")
@@ -369,7 +441,7 @@ class Orchestrator:
                     events_data = result.get('events', []) if result and result.get('success') else []
                     sql_query = self.sql_agent.text_to_sql(user_input, events=events_data)
                     if sql_query:
-                        events = self.database_agent.execute_query(sql_query, print_raw=False)
+                        events = self.database_agent.execute_query(sql_query, print_raw=False, limit=constants.MAX_EVENTS_FOR_RESPONSE)
                         response = self.response_agent.generate_response(user_input, events)
                         print(response)
                 
@@ -380,4 +452,12 @@ class Orchestrator:
                 break
             except Exception as e:
                 print(f"\nError: {e}\n")
+        
+        if 'sql_agent' in self.__dict__:
+            self.sql_agent.close()
+        self.database_agent.close()
+        
+        # Release pooled connections on the loop that opened them
+        self._loop.run_until_complete(groq_client.aclose())
+        self._loop.close()
 
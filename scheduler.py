@@ -1,10 +1,13 @@
 """Main entry point."""
+import logging
+import os
 from orchestrator import Orchestrator
 from calendar_manager import CalendarManager
 
 
 def main():
     """Run the calendar assistant."""
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
     try:
         print("Initializing calendar assistant...")
         calendar = CalendarManager()
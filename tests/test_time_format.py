@@ -0,0 +1,42 @@
+"""Tests for agents.time_format."""
+import os
+import sys
+import unittest
+from datetime import datetime
+
+# Add parent directory to path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from agents.time_format import parse_local_datetime
+
+
+class ParseLocalDatetimeTest(unittest.TestCase):
+    """parse_local_datetime must accept and reject exactly what strptime('%Y-%m-%d %H:%M') does."""
+
+    def test_parses_action_parser_format(self):
+        self.assertEqual(parse_local_datetime('2024-03-05 14:30'), datetime(2024, 3, 5, 14, 30))
+
+    def test_rejects_other_iso_forms(self):
+        for value in (
+            '2024-03-05T14:30',
+            '2024-W10-2 14:30',
+            '20240305T143000Z',
+            '2024-03-05T14+05',
+            '2024-03-05 14:30+05:00',
+            '2024-03-05 14:30:00',
+            '2024-03-05',
+        ):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    datetime.strptime(value, '%Y-%m-%d %H:%M')
+                with self.assertRaises(ValueError):
+                    parse_local_datetime(value)
+
+    def test_result_is_naive(self):
+        self.assertIsNone(parse_local_datetime('2024-12-31 23:59').tzinfo)
+
+
+if __name__ == '__main__':
+    unittest.main()
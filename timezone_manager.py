@@ -1,7 +1,40 @@
 """Timezone management for the calendar system."""
-import pytz
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+_UTC = timezone.utc
+
+
+@lru_cache(maxsize=1)
+def timezone_names() -> dict:
+    """Lowercased IANA name -> canonical name, so names are accepted case-insensitively."""
+    return {name.lower(): name for name in available_timezones()}
+
+
+def get_zone(timezone_str: str) -> ZoneInfo:
+    """
+    Look up a timezone by IANA name, ignoring case.
+    
+    Raises:
+        ZoneInfoNotFoundError: If the name is not a known timezone
+    """
+    try:
+        return ZoneInfo(timezone_str)
+    except (ZoneInfoNotFoundError, ValueError):
+        canonical = timezone_names().get(timezone_str.lower())
+        if canonical is None:
+            raise ZoneInfoNotFoundError(timezone_str)
+        return ZoneInfo(canonical)
+
+
+def _to_utc(dt: datetime, user_timezone) -> datetime:
+    """Convert to UTC, treating naive datetimes as user_timezone wall time."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=user_timezone)
+    return dt.astimezone(_UTC)
 
 
 class TimezoneManager:
@@ -15,14 +48,19 @@ class TimezoneManager:
             timezone_str: Timezone string (e.g., 'America/New_York', 'UTC', 'Asia/Kolkata')
                          If None, defaults to UTC
         """
+        # zoneinfo zones are applied with dt.replace(tzinfo=...); no pytz-style localize() needed
         if timezone_str:
             try:
-                self.user_timezone = pytz.timezone(timezone_str)
-            except pytz.exceptions.UnknownTimeZoneError:
+                self.user_timezone = get_zone(timezone_str)
+            except ZoneInfoNotFoundError:
                 print(f"Warning: Unknown timezone '{timezone_str}'. Using UTC.")
-                self.user_timezone = pytz.UTC
+                self.user_timezone = ZoneInfo('UTC')
         else:
-            self.user_timezone = pytz.UTC
+            self.user_timezone = ZoneInfo('UTC')
+        # (expires_at, offset hours, SQLite modifier); offsets only change at DST transitions,
+        # which fall on a 15-minute UTC boundary in every zone (Lord Howe switches at 15:30 UTC),
+        # so each value lives until the next one
+        self._offset_cache = None
     
     def set_timezone(self, timezone_str: str) -> bool:
         """
@@ -35,13 +73,14 @@ class TimezoneManager:
             True if successful, False if invalid timezone
         """
         try:
-            self.user_timezone = pytz.timezone(timezone_str)
+            self.user_timezone = get_zone(timezone_str)
+            self._offset_cache = None
             return True
-        except pytz.exceptions.UnknownTimeZoneError:
+        except ZoneInfoNotFoundError:
             print(f"Error: Unknown timezone '{timezone_str}'")
             return False
     
-    def get_timezone(self) -> pytz.BaseTzInfo:
+    def get_timezone(self) -> ZoneInfo:
         """Get the current user timezone."""
         return self.user_timezone
     
@@ -61,7 +100,7 @@ class TimezoneManager:
         """
         if dt.tzinfo is None:
             # Assume UTC if naive
-            dt = pytz.UTC.localize(dt)
+            dt = dt.replace(tzinfo=_UTC)
         
         return dt.astimezone(self.user_timezone)
     
@@ -75,11 +114,8 @@ class TimezoneManager:
         Returns:
             Datetime in UTC
         """
-        if dt.tzinfo is None:
-            # Assume user timezone if naive
-            dt = self.user_timezone.localize(dt)
-        
-        return dt.astimezone(pytz.UTC)
+        # Naive datetimes are assumed to be in the user timezone
+        return _to_utc(dt, self.user_timezone)
     
     def now_in_user_tz(self) -> datetime:
         """Get current time in user's timezone."""
@@ -96,12 +132,11 @@ class TimezoneManager:
             String in format 'YYYY-MM-DD HH:MM:SS' (UTC)
         """
         # Convert to UTC first
-        if dt.tzinfo is None:
-            dt = self.user_timezone.localize(dt)
-        utc_dt = dt.astimezone(pytz.UTC)
+        utc_dt = _to_utc(dt, self.user_timezone)
         
-        # Format for SQLite
-        return utc_dt.strftime('%Y-%m-%d %H:%M:%S')
+        # Format for SQLite; same output as strftime('%Y-%m-%d %H:%M:%S') without parsing the format
+        return (f"{utc_dt.year:04d}-{utc_dt.month:02d}-{utc_dt.day:02d} "
+                f"{utc_dt.hour:02d}:{utc_dt.minute:02d}:{utc_dt.second:02d}")
     
     def parse_from_sqlite(self, sqlite_str: str) -> datetime:
         """
@@ -113,9 +148,8 @@ class TimezoneManager:
         Returns:
             Datetime object in user's timezone
         """
-        # Parse as UTC
-        utc_dt = datetime.strptime(sqlite_str, '%Y-%m-%d %H:%M:%S')
-        utc_dt = pytz.UTC.localize(utc_dt)
+        # Parse as UTC; fromisoformat is implemented in C, unlike strptime's regex-based parser
+        utc_dt = datetime.fromisoformat(sqlite_str).replace(tzinfo=_UTC)
         
         # Convert to user timezone
         return utc_dt.astimezone(self.user_timezone)
@@ -127,9 +161,7 @@ class TimezoneManager:
         Returns:
             Offset in hours (e.g., -5.0 for EST, 5.5 for IST)
         """
-        now = datetime.now(self.user_timezone)
-        offset = now.utcoffset()
-        return offset.total_seconds() / 3600.0
+        return self._current_offset()[1]
     
     def get_sqlite_timezone_modifier(self) -> str:
         """
@@ -139,15 +171,27 @@ class TimezoneManager:
         Returns:
             SQLite timezone modifier string (e.g., '-5 hours' for EST)
         """
-        offset_hours = self.get_utc_offset_hours()
+        return self._current_offset()[2]
+    
+    def _current_offset(self) -> tuple:
+        """Return the cached (expires_at, offset hours, SQLite modifier), recomputing it once it expires."""
+        now = time.time()
+        cached = self._offset_cache
+        if cached is not None and now < cached[0]:
+            return cached
+        
+        offset_hours = datetime.now(self.user_timezone).utcoffset().total_seconds() / 3600.0
         sign = '-' if offset_hours < 0 else '+'
         hours = abs(int(offset_hours))
         minutes = abs(int((offset_hours % 1) * 60))
         
         # SQLite doesn't support fractional hours directly, so we use hours and minutes
         if minutes == 0:
-            return f"{sign}{hours} hours"
+            modifier = f"{sign}{hours} hours"
         else:
             # Use both hours and minutes
-            return f"{sign}{hours} hours, {sign}{minutes} minutes"
+            modifier = f"{sign}{hours} hours, {sign}{minutes} minutes"
+        
+        self._offset_cache = cached = (now - now % 900 + 900, offset_hours, modifier)
+        return cached
 